@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+'''
+Export API benchmark suite against the bundled stub server (pyswrve.stub),
+network access isn't needed
+Usage: python benchmarks/bench_api.py [--latency 0.05] [--error-rate 0]
+'''
+
+import argparse, os, shutil, tempfile, time
+
+from pyswrve.api import SwrveSession
+from pyswrve.metrics import MetricsCollector
+from pyswrve.stub import StubServer
+from pyswrve.utils import Downloader
+
+def timeit(func, repeat=1):
+    ''' Return average seconds of func call '''
+
+    start = time.time()
+    for i in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+def report(name, seconds, requests=None):
+
+    if requests:
+        print('%-40s %8.3f s %8.1f req/s' % (name, seconds,
+                                             requests / seconds))
+    else:
+        print('%-40s %8.3f s' % (name, seconds))
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--file-size', type=int, default=4194304)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    stub = StubServer(latency=args.latency, error_rate=args.error_rate,
+                      items=args.items, files=args.files,
+                      file_size=args.file_size).start()
+    metrics = MetricsCollector()
+    s = SwrveSession('key', 'key', base_url=stub.url, hooks=metrics)
+    s.transport.backoff = 0.01
+    s.set_dates('2015-01-01', '2015-01-%02d' % min(args.days, 31))
+    dst = tempfile.mkdtemp(prefix='pyswrve_bench_')
+
+    print('Stub %s, latency %.3f s, error rate %.2f\n' %
+          (stub.url, args.latency, args.error_rate))
+    try:
+        # Single calls
+        report('get_kpi', timeit(lambda: s.get_kpi('dau'), args.repeat))
+        report('get_evt_stat (payload)', timeit(
+            lambda: s.get_evt_stat('event.1', 'key1'), args.repeat))
+        report('get_item_sales', timeit(s.get_item_sales, args.repeat))
+
+        # Few KPI factors, DAU is requested once
+        count = len(s.kpi_factors)
+        for workers in (1, 8, 16):
+            s.invalidate_dau_cache()
+            report('get_few_kpi per_user, %s workers' % workers, timeit(
+                lambda: s.get_few_kpi(s.kpi_factors, per_user=True,
+                                      workers=workers)), count + 1)
+
+        # Activity scans, every event / segment is requested
+        for workers in (1, 16):
+            report('get_evt_lst active_only, %s workers' % workers, timeit(
+                lambda: s.get_evt_lst(active_only=True, workers=workers)),
+                args.items + 1)
+        for workers in (1, 16):
+            s.invalidate_dau_cache()
+            report('get_segment_lst active_only, %s workers' % workers,
+                   timeit(lambda: s.get_segment_lst(active_only=True,
+                                                    workers=workers)),
+                   args.items + 1)
+
+        # Userdb downloads
+        d = Downloader('key', 'key', base_url=stub.url, hooks=metrics)
+        urls = d.get_urls('users')
+        for url in urls:  # files are generated on first request
+            stub.file(url.rsplit('/', 1)[1])
+        mbytes = args.files * args.file_size / 1048576.0
+        for workers in (1, 4):
+            for name in os.listdir(dst):
+                os.remove(os.path.join(dst, name))
+            d.load_to_queue(urls)
+            seconds = timeit(lambda: d.download_start(dst, workers=workers))
+            print('%-40s %8.3f s %8.1f MB/s' % (
+                'userdb download, %s workers' % workers, seconds,
+                mbytes / seconds))
+
+        print('\nRequests by endpoint:')
+        for name, m in sorted(metrics.snapshot()['endpoints'].items()):
+            print('  %-36s %6s requests %4s retries %8.1f ms avg' % (
+                name, m['requests'], m['retries'], m['latency_avg'] * 1000))
+    finally:
+        s.close()
+        stub.stop()
+        shutil.rmtree(dst)
+
+if __name__ == '__main__':
+    main()
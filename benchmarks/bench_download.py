@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+Userdb download benchmark against a local file server:
+1 KB chunks with flush after every chunk vs big buffered chunks
+Usage: python benchmarks/bench_download.py [file_size_mb]
+'''
+
+import os, shutil, sys, tempfile, threading, time
+
+from pyswrve.transport import Transport
+from pyswrve.utils import Downloader
+
+if sys.version_info[0] < 3:  # Python 2
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+else:  # Python 3
+    from http.server import SimpleHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+class FileServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+def download_small_chunks(transport, url, fpath):
+    ''' Old download loop: 1 KB chunks and flush after every chunk '''
+
+    req = transport.get(url, stream=True)
+    with open(fpath, 'wb') as f:
+        for i in req.iter_content(chunk_size=1024):
+            if i:
+                f.write(i)
+                f.flush()
+
+def main():
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    src = tempfile.mkdtemp(prefix='pyswrve_bench_src_')
+    dst = tempfile.mkdtemp(prefix='pyswrve_bench_dst_')
+    with open(os.path.join(src, 'userdb.gz'), 'wb') as f:
+        for i in range(size):
+            f.write(os.urandom(1048576))
+
+    cwd = os.getcwd()
+    os.chdir(src)  # SimpleHTTPRequestHandler serves current directory
+    server = FileServer(('127.0.0.1', 0), QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%s/userdb.gz' % server.server_address[1]
+
+    try:
+        with Transport() as t:
+            start = time.time()
+            download_small_chunks(t, url, os.path.join(dst, 'userdb.gz'))
+            before = time.time() - start
+            os.remove(os.path.join(dst, 'userdb.gz'))
+
+            d = Downloader('key', 'key', transport=t)
+            start = time.time()
+            d.download_file(url, dst)
+            after = time.time() - start
+
+        print('1 KB chunks + flush:     %.2f s (%.1f MB/s)' %
+              (before, size / before))
+        print('1 MB buffered + md5:     %.2f s (%.1f MB/s)' %
+              (after, size / after))
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(src)
+        shutil.rmtree(dst)
+
+if __name__ == '__main__':
+    main()
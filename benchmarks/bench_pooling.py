@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''
+Requests/sec benchmark for pooled transport against a local stub server
+Usage: python benchmarks/bench_pooling.py [requests_count]
+'''
+
+import json, sys, threading, time
+
+import requests
+
+from pyswrve.transport import Transport
+
+if sys.version_info[0] < 3:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+else:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+# KPI-like response body, 30 days of data
+BODY = json.dumps([{
+    'name': 'dau',
+    'data': [['D-2015-01-%02d' % i, 100.0 + i] for i in range(1, 31)]
+}]).encode('utf-8')
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep-alive support
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+class StubServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+def bench(get, url, count):
+    ''' Do count requests with get func. Return requests per second. '''
+
+    start = time.time()
+    for i in range(count):
+        get(url, params={'api_key': 'key', 'start': '2015-01-01'}).json()
+
+    return count / (time.time() - start)
+
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%s/api/1/exporter/kpi/dau.json' % \
+        server.server_address[1]
+
+    print('requests.get (no pooling): %.1f req/s' %
+          bench(requests.get, url, count))
+    with Transport() as t:
+        print('Transport (pooled):        %.1f req/s' % bench(t.get, url, count))
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+'''
+Micro-benchmark of list filtering by q / nq queries on synthetic event names
+Usage: python benchmarks/bench_query.py [names_count]
+'''
+
+import random, re, sys, time
+
+from pyswrve.query import QueryFilter
+
+def old_filter(data, q, nq):
+    ''' Filter with re.findall for every (item, query) pair and list test '''
+
+    ok_res = []
+    bad_res = []
+    for item in data:
+        for qi in q:
+            if re.findall(qi, item, re.IGNORECASE):
+                ok_res.append(item)
+        for nqi in nq:
+            if re.findall(nqi, item, re.IGNORECASE):
+                bad_res.append(item)
+
+    return [item for item in ok_res if item not in bad_res]
+
+def bench(func, *args):
+    ''' Return result and seconds of func call '''
+
+    start = time.time()
+    res = func(*args)
+    return res, time.time() - start
+
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(1)
+    parts = ['purchase', 'level', 'quest', 'tutorial', 'shop', 'currency',
+             'reward', 'battle', 'social', 'ads']
+    names = ['%s.%s.%s' % (random.choice(parts), random.choice(parts), i)
+             for i in range(count)]
+
+    for title, q, nq in (('literals', ['purchase', 'shop', 'reward'],
+                          ['ads', 'tutorial']),
+                         ('regexps', [r'^level\.', r'quest\.\w+\.1'],
+                          [r'\.ads\.'])):
+        new, t_new = bench(QueryFilter(q, nq).filter, names)
+        # Old filter is quadratic, check it on smaller list
+        small = names[:min(count, 20000)]
+        old, t_old = bench(old_filter, small, q, nq)
+        print('%s: old %.3f s for %s names, new %.3f s for %s names' %
+              (title, t_old, len(small), t_new, count))
+
+if __name__ == '__main__':
+    main()
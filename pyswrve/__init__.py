@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from pyswrve.api import SwrveSession as API
+from pyswrve.apps import AppManager
+from pyswrve.errors import (SwrveError, SwrveAPIError, SwrveHTTPError,
+                            RateLimitError)
 import pyswrve.utils
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, pure python is used without it
+    np = None
+
+from pyswrve.series import TimeSeries
+
+# Parsed dates by labels, labels are the same for all series of one report
+_dates = {}
+
+# Min count of values when numpy is used instead of pure python
+NUMPY_MIN_SIZE = 1000
+
+REDUCERS = ('sum', 'mean', 'min', 'max', 'first', 'last', 'count')
+
+def parse_date(label):
+    '''
+    Convert '2015-01-31' or swrve label 'D-2015-01-31' to datetime.date,
+    month and day can be without leading zero ('2015-1-5')
+    Results are cached
+    '''
+
+    d = _dates.get(label)
+    if d is None:
+        y, m, day = label.split('-')[-3:]
+        d = date(int(y), int(m), int(day))
+        if len(_dates) < 100000:
+            _dates[label] = d
+
+    return d
+
+def bucket_start(d, freq, first=None):
+    '''
+    Return first day of bucket which date belongs to
+    # freq - 'week' (7 days since first date), 'isoweek' (since Monday),
+    # 'month', 'quarter', 'year' or count of days since first date
+    '''
+
+    if freq == 'isoweek':
+        return date.fromordinal(d.toordinal() - d.weekday())
+    elif freq == 'month':
+        return date(d.year, d.month, 1)
+    elif freq == 'quarter':
+        return date(d.year, (d.month - 1) // 3 * 3 + 1, 1)
+    elif freq == 'year':
+        return date(d.year, 1, 1)
+
+    days = 7 if freq == 'week' else int(freq)
+    offset = (d.toordinal() - first.toordinal()) // days * days
+    return date.fromordinal(first.toordinal() + offset)
+
+def _buckets(dates, freq):
+    '''
+    Split sorted dates to buckets
+    Return list with bucket start dates and list with first index of buckets
+    '''
+
+    starts = []
+    index = []
+    for i, d in enumerate(dates):
+        b = bucket_start(d, freq, dates[0])
+        if not starts or starts[-1] != b:
+            starts.append(b)
+            index.append(i)
+
+    return starts, index
+
+def _reduce_numpy(values, index, how):
+    ''' Reduce 2-D values (days x series) by buckets with numpy '''
+
+    values = np.asarray(values, dtype=np.float64)
+    index = np.asarray(index)
+    counts = np.diff(np.append(index, len(values))).reshape(-1, 1)
+
+    if how == 'sum':
+        return np.add.reduceat(values, index, axis=0)
+    elif how == 'mean':
+        return np.add.reduceat(values, index, axis=0) / counts
+    elif how == 'min':
+        return np.minimum.reduceat(values, index, axis=0)
+    elif how == 'max':
+        return np.maximum.reduceat(values, index, axis=0)
+    elif how == 'first':
+        return values[index]
+    elif how == 'last':
+        return values[index + counts.ravel() - 1]
+    else:  # count
+        return np.repeat(counts, values.shape[1], axis=1).astype(np.float64)
+
+def _reduce_python(values, index, how):
+    ''' Reduce 2-D values (days x series) by buckets with pure python '''
+
+    res = []
+    bounds = list(zip(index, index[1:] + [len(values)]))
+    for start, stop in bounds:
+        chunk = values[start:stop]
+        row = []
+        for col in zip(*chunk):
+            if how == 'sum':
+                row.append(sum(col))
+            elif how == 'mean':
+                row.append(sum(col) / float(len(col)))
+            elif how == 'min':
+                row.append(min(col))
+            elif how == 'max':
+                row.append(max(col))
+            elif how == 'first':
+                row.append(col[0])
+            elif how == 'last':
+                row.append(col[-1])
+            else:  # count
+                row.append(len(col))
+        res.append(row)
+
+    return res
+
+def reduce_values(dates, values, freq='week', how='sum'):
+    '''
+    Aggregate 2-D values (row per day, column per series) by buckets
+    # dates - sorted list with datetime.date
+    # how - 'sum', 'mean', 'min', 'max', 'first', 'last' or 'count'
+    None values (swrve nulls) are 0 like in series.TimeSeries
+    Return list with bucket start dates and aggregated rows
+    (numpy array for big inputs if numpy is installed)
+    '''
+
+    if how not in REDUCERS:
+        raise ValueError('Unknown reducer %s, use one of %s' %
+                         (how, ', '.join(REDUCERS)))
+    if not dates:
+        return [], []
+
+    if np is None or not isinstance(values, np.ndarray):
+        values = [[0 if v is None else v for v in row] for row in values]
+
+    starts, index = _buckets(dates, freq)
+    if np is not None and (isinstance(values, np.ndarray) or
+                           len(values) * len(values[0]) >= NUMPY_MIN_SIZE):
+        return starts, _reduce_numpy(values, index, how)
+    else:
+        return starts, _reduce_python(values, index, how)
+
+def resample(data, freq='week', how='sum'):
+    '''
+    Aggregate daily data by weeks, months, etc...
+    # data - list like [['D-2015-01-31', 1.0, 2.0, ...], ...] (get_kpi or
+    # get_few_kpi result), dict {name: [['D-2015-01-31', 1.0], ...]}
+    # (get_evt_stat, get_item_sales) or series.TimeSeries
+    # freq - 'week' (7 days since first date), 'isoweek' (since Monday),
+    # 'month', 'quarter', 'year' or count of days since first date
+    # how - 'sum', 'mean', 'min', 'max', 'first', 'last' or 'count'
+    Return the same type as data, dates are first days of buckets
+    like '2015-01-31'
+    '''
+
+    if isinstance(data, TimeSeries):
+        dates = data.dates.astype(object).tolist()
+        starts, values = reduce_values(dates, data.values, freq, how)
+        return TimeSeries(starts, values, data.names)
+
+    elif isinstance(data, dict):
+        names = list(data.keys())
+        if not names:
+            return {}
+        first = data[names[0]]
+        dates = [parse_date(i[0]) for i in first]
+        values = [[data[name][i][1] for name in names]
+                  for i in range(len(first))]
+        starts, values = reduce_values(dates, values, freq, how)
+
+        res = {}
+        for col, name in enumerate(names):
+            res[name] = [[str(d), row[col]] for d, row in
+                         zip(starts, _tolist(values))]
+        return res
+
+    else:
+        dates = [parse_date(i[0]) for i in data]
+        values = [i[1:] for i in data]
+        starts, values = reduce_values(dates, values, freq, how)
+        return [[str(d)] + list(row) for d, row in
+                zip(starts, _tolist(values))]
+
+def _tolist(values):
+    ''' Convert numpy array to lists, lists are returned as is '''
+
+    if np is not None and isinstance(values, np.ndarray):
+        return values.tolist()
+    return values
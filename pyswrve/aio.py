@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+
+import asyncio, time
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is optional, needed only for async session
+    aiohttp = None
+
+from pyswrve import expr
+from pyswrve.api import SwrveSession
+from pyswrve.errors import SwrveHTTPError
+from pyswrve.fastjson import loads
+from pyswrve.metrics import endpoint
+from pyswrve.windows import merge_responses
+
+class AsyncSingleFlightCache(object):
+    '''
+    In-memory cache for asyncio
+    Concurrent callers asking for the same key share one in-flight request
+    '''
+
+    def __init__(self, name='memory', hooks=None):
+
+        # name, hooks - lookups are reported to metrics.Hooks with name
+        self.name = name
+        self.hooks = hooks
+
+        self.__data = {}
+        self.__expires = {}  # expiration time of keys with ttl
+        self.__flights = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__data)
+
+    async def get(self, key, func, ttl=None):
+        '''
+        Return cached value for key or await func() to get it
+        None results are not cached
+        # ttl - seconds while value is valid, if not set value never expires
+        '''
+
+        if self.__expires.get(key, float('inf')) < time.time():
+            self.__data.pop(key, None)
+            del self.__expires[key]
+
+        flight = self.__flights.get(key)
+        hit = key in self.__data or flight is not None
+        if self.hooks is not None:
+            self.hooks.cache(self.name, hits=int(hit), misses=int(not hit))
+
+        if key in self.__data:
+            self.hits += 1
+            return self.__data[key]
+
+        if flight is None:  # first caller does request
+            self.misses += 1
+            flight = asyncio.ensure_future(func())
+            self.__flights[key] = flight
+            try:
+                result = await flight
+            finally:
+                del self.__flights[key]
+            if result is not None:
+                self.__data[key] = result
+                if ttl is not None:
+                    self.__expires[key] = time.time() + ttl
+            return result
+        else:  # other callers wait for its result
+            self.hits += 1
+            return await asyncio.shield(flight)
+
+    def invalidate(self, key=None):
+        ''' Remove key from cache, if key not set remove all keys '''
+
+        if key is None:
+            self.__data.clear()
+            self.__expires.clear()
+        else:
+            self.__data.pop(key, None)
+            self.__expires.pop(key, None)
+
+    def stats(self):
+        ''' Return dict with hits, misses and size counters '''
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.__data)}
+
+class AsyncSwrveSession(SwrveSession):
+    '''
+    Non-blocking swrve session for asyncio based on aiohttp
+    Methods are the same as SwrveSession methods but they are coroutines,
+    responses are processed by the same SwrveSession code.
+    On-disk response cache isn't used by async session.
+    '''
+
+    def __init__(self, api_key=None, personal_key=None, limit=100,
+                 limit_per_host=20, client=None, **kwargs):
+
+        # limit - max count of simultaneous connections
+        # limit_per_host - max count of simultaneous connections to one host
+        # client - aiohttp.ClientSession, created on first request if not set
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for async session')
+
+        super(AsyncSwrveSession, self).__init__(api_key, personal_key,
+                                                **kwargs)
+
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.client = client
+        self.__own_client = client is None
+
+        # DAU series shared by all per user computations
+        self.dau_cache = AsyncSingleFlightCache('dau', self.hooks)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __client(self):
+        ''' Return aiohttp client session, create it if needed '''
+
+        if self.client is None:
+            timeout = self.transport.timeout
+            if isinstance(timeout, tuple):
+                timeout = aiohttp.ClientTimeout(sock_connect=timeout[0],
+                                                sock_read=timeout[1])
+            else:
+                timeout = aiohttp.ClientTimeout(total=timeout)
+
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host)
+            self.client = aiohttp.ClientSession(connector=connector,
+                                                timeout=timeout)
+
+        return self.client
+
+    async def close(self):
+        ''' Close client session and pooled connections '''
+
+        if self.client is not None and self.__own_client:
+            await self.client.close()
+            self.client = None
+        super(AsyncSwrveSession, self).close()
+
+    async def _request(self, url, params, series=False):
+        '''
+        Do non-blocking request and decode json. Return decoded data.
+        Raise errors.SwrveError subclass if request was failed
+        # series - response is a list of time series, long dates range
+        # can be split by windows
+        '''
+
+        windows = self._windows(params) if series else None
+        if not windows:
+            return await self._get_json(url, params)
+
+        async def get_func(window):
+            window_params = dict(params)
+            window_params['start'], window_params['stop'] = window
+            try:
+                return await self._get_json(url, window_params)
+            except (SwrveHTTPError, aiohttp.ClientError,
+                    asyncio.TimeoutError) as e:
+                return e  # api errors aren't retried and raised at once
+
+        # Failed windows are requested again, other windows are kept
+        parts = [None] * len(windows)
+        todo = list(range(len(windows)))
+        for attempt in range(self.window_retries + 1):
+            res = await self._gather([get_func(windows[i]) for i in todo],
+                                     self.window_workers)
+            for i, part in zip(todo, res):
+                parts[i] = part
+            todo = [i for i in todo if isinstance(parts[i], Exception)]
+            if not todo:
+                break
+
+        if todo:  # some windows are failed after all retries
+            raise parts[todo[0]]
+
+        return merge_responses(parts, windows)
+
+    async def _get_json(self, url, params):
+        '''
+        Do non-blocking request and decode json
+        Rate limiter and retries settings are taken from self.transport
+        '''
+
+        # None params are skipped like requests does, other are strings
+        params = dict((k, v if isinstance(v, (str, int, float)) else str(v))
+                      for k, v in params.items() if v is not None)
+
+        transport = self.transport
+        limiter = transport.rate_limiter
+        hooks = self.hooks
+        name = endpoint(url)
+        start = hooks.request_start(name, url, params)
+        retry = 0
+        while True:
+            if limiter is not None:
+                await asyncio.sleep(limiter.reserve())
+
+            try:
+                async with self.__client().get(url, params=params) as resp:
+                    status = resp.status
+                    retry_after = resp.headers.get('Retry-After', '')
+                    body = await resp.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if retry >= transport.max_retries:
+                    hooks.request_end(name, start, error=e)
+                    raise
+                hooks.retry(name, type(e).__name__)
+                await asyncio.sleep(transport.retry_delay(retry))
+                retry += 1
+                continue
+
+            if status not in transport.retry_statuses:
+                if limiter is not None:
+                    limiter.succeeded()
+                break
+
+            if status == 429 and limiter is not None:
+                limiter.throttled()
+            if retry >= transport.max_retries:
+                break
+
+            if retry_after.isdigit():
+                delay = min(float(retry_after), transport.max_backoff)
+            else:
+                delay = transport.retry_delay(retry)
+            hooks.retry(name, status)
+            await asyncio.sleep(delay)
+            retry += 1
+
+        hooks.request_end(name, start, status, len(body))
+        try:
+            req = loads(body)
+        except ValueError:  # not json, html error page
+            req = None
+        return self._check_response(req, url, status)
+
+    async def _gather(self, coros, workers=None):
+        '''
+        Run coroutines concurrently, return list of results in the same order
+        # workers - max count of simultaneously running coroutines
+        '''
+
+        if not workers:
+            return await asyncio.gather(*coros)
+
+        sem = asyncio.Semaphore(workers)
+
+        async def run(coro):
+            async with sem:
+                return await coro
+
+        return await asyncio.gather(*[run(coro) for coro in coros])
+
+    ### --- KPI --- ###
+    async def get_kpi(self, factor, with_date=True, currency=None, params=None,
+                      tax=None, as_array=False):
+        ''' Request KPI factor data from swrve. Return list. '''
+
+        url, params = self._kpi_request(factor, currency, params)
+        req = await self._request(url, params, series=True)
+
+        return self._kpi_data(req, factor, with_date, tax, as_array)
+
+    async def get_dau(self, params=None):
+        '''
+        Request DAU values without dates. Return list.
+        Results are cached by api_key, start, stop, history and segment params
+        '''
+
+        params = params or self.defaults
+        dau = await self.dau_cache.get(
+            self._dau_key(params),
+            lambda: self.get_kpi('dau', False, params=dict(params)),
+            self._dau_ttl(params))
+        return list(dau)  # copy, cached list must not be changed
+
+    async def get_kpi_dau(self, factor, with_date=True, currency=None,
+                          params=None, tax=None, dau=None, as_array=False):
+        ''' Request data for KPI factor / DAU (per one user). Return list. '''
+
+        url, params = self._kpi_request(factor, currency, params)
+        if dau is None:
+            dau = await self.get_dau(params)
+        req = await self._request(url, params, series=True)
+
+        return self._kpi_dau_data(req, factor, dau, with_date, tax, as_array)
+
+    async def get_few_kpi(self, factor_lst, with_date=True, per_user=False,
+                          currency=None, params=None, tax=None, workers=None,
+                          as_array=False):
+        '''
+        Request data for few different KPI factors concurrently. Return list.
+        # workers - max count of simultaneous requests
+        '''
+
+        params = params or dict(self.defaults) # request params
+        if currency:
+            params['currency'] = currency  # cash, coins, etc...
+
+        coros = []
+        dates_lst = [with_date] + [False] * (len(factor_lst) - 1)
+        tasks = list(zip(factor_lst, dates_lst))
+        for factor, wd in tasks:
+            if per_user:  # divided by DAU when all requests are done
+                url, task_params = self._kpi_request(factor, None,
+                                                     dict(params))
+                coros.append(self._request(url, task_params, series=True))
+            else:
+                coros.append(self.get_kpi(factor, wd, params=dict(params),
+                                          tax=tax, as_array=as_array))
+        if per_user:  # DAU is requested once together with factors
+            coros.append(self.get_dau(dict(params)))
+
+        data_lst = await self._gather(coros, workers)
+        if per_user:
+            dau = data_lst.pop()
+            data_lst = [self._kpi_dau_data(req, factor, dau, wd, tax, as_array)
+                        for req, (factor, wd) in zip(data_lst, tasks)]
+
+        return self._few_kpi_data(data_lst, factor_lst, with_date, as_array)
+
+    async def get_derived(self, exprs, with_date=True, params=None,
+                          variables=None, workers=8, ndigits=4,
+                          as_array=False):
+        '''
+        Calculate derived KPI from expressions, every distinct base series
+        is requested once and concurrently (see expr module)
+        '''
+
+        variables = variables or {}
+        parsed = expr.parse(exprs, variables, self.kpi_factors)
+        keys = expr.dependencies(parsed)
+        req_keys = expr.request_keys(keys)
+        params = params or dict(self.defaults) # request params
+
+        res = await self._gather([expr.request(self, key, params)
+                                  for key in req_keys], workers)
+        labels, series = expr.series_data(keys, dict(zip(req_keys, res)))
+
+        return expr.compute(parsed, labels, series, variables, with_date,
+                            ndigits, as_array)
+
+    ### --- Events --- ###
+    async def get_evt_lst(self, q=None, nq=None, params=None,
+                          active_only=None, workers=None):
+        ''' Request list with all events from swrve. Return list. '''
+
+        url = self._url('event/list')
+        params = params or dict(self.defaults) # request params
+
+        req = await self._request(url, params)
+
+        res = self._lst_data(req, q, nq)
+
+        if active_only:  # if set active only check every event
+            evt_params = dict(params)
+            evt_params['segment'] = None
+            return await self._scan_active(
+                res, lambda evt: self.__evt_active(evt, evt_params), workers)
+        else:
+            return res
+
+    async def get_payload_lst(self, ename=None, q=None, nq=None, params=None):
+        ''' Request payloads list for event. Return list. '''
+
+        url = self._url('event/payloads')
+        params = params or dict(self.defaults) # request params
+        if ename:
+            params['name'] = ename
+
+        req = await self._request(url, params)
+
+        return self._lst_data(req, q, nq)
+
+    async def get_evt_stat(self, ename=None, payload=None, payload_val=None,
+                           payload_sum=None, with_date=True, per_user=False,
+                           params=None, as_array=False, stream=False):
+        '''
+        Request events triggering count with(out) payload key.
+        # stream - response isn't cached and isn't split by windows like
+        # SwrveSession streamed request, but it's decoded at once
+        '''
+
+        if (payload_val or payload_sum) and not payload:
+            print('\
+If you use payload value or sum then you need to set payload too')
+            return
+
+        url, params = self._evt_stat_request(ename, payload, params)
+        if stream and payload:
+            req = await self._get_json(url, params)
+            return self._evt_stat_stream(req, payload_val, payload_sum,
+                                         with_date, as_array)
+        req = await self._request(url, params, series=True)
+
+        dau = None
+        if per_user and not payload:  # calc for one user
+            dau = await self.get_dau(params)
+
+        return self._evt_stat_data(req, payload, payload_val, payload_sum,
+                                   with_date, dau, as_array)
+
+    async def get_evt_stat_bulk(self, specs, with_date=True, params=None,
+                                workers=8, as_array=False):
+        ''' Request triggering counts for many events and payload keys '''
+
+        specs, tasks = self._evt_specs(specs)
+        params = params or dict(self.defaults) # request params
+
+        async def get_func(task):
+            url, task_params = self._evt_stat_request(task[0], task[1],
+                                                      dict(params))
+            return await self._request(url, task_params, series=True)
+
+        req_lst = await self._gather([get_func(task) for task in tasks],
+                                     workers)
+
+        return self._evt_bulk_data(specs, dict(zip(tasks, req_lst)),
+                                   with_date, as_array)
+
+    ### --- Items & Resources --- ###
+    async def get_item_sales(self, item=None, tag=None, currency=None,
+                             revenue=True, with_date=True, per_user=False,
+                             params=None, as_array=False):
+        ''' Request count of item sales or revenue from items sales '''
+
+        url, params = self._item_sales_request(item, tag, currency, revenue,
+                                               params)
+        req = await self._request(url, params, series=True)
+
+        dau = None
+        if per_user:  # calc for one user
+            dau = await self.get_dau(params)
+
+        return self._item_sales_data(req, with_date, dau, as_array)
+
+    async def get_item_matrix(self, items=None, tags=None, currencies=None,
+                              revenue=True, sales=True, with_date=True,
+                              per_user=False, params=None, workers=8,
+                              as_array=False):
+        ''' Request revenue and sales for few items and currencies '''
+
+        params = params or dict(self.defaults) # request params
+        tasks = self._item_tasks(items, tags, currencies, revenue, sales)
+
+        async def get_func(task):
+            kind, item, tag, currency = task
+            url, task_params = self._item_sales_request(
+                item, tag, currency, kind == 'revenue', dict(params))
+            return await self._request(url, task_params, series=True)
+
+        coros = [get_func(task) for task in tasks]
+        if per_user:  # the same DAU for all items, requested once
+            coros.append(self.get_dau(dict(params)))
+        res = await self._gather(coros, workers)
+
+        dau = res.pop() if per_user else None
+        return self._item_matrix_data(tasks, res, with_date, dau, as_array)
+
+    ### --- Segments --- ###
+    async def get_segment_lst(self, q=None, nq=None, params=None,
+                              active_only=None, workers=None):
+        ''' Request list with all segments from swrve. Return list. '''
+
+        url = self._url('segment/list')
+        params = params or dict(self.defaults) # request params
+
+        req = await self._request(url, params)
+
+        res = self._lst_data(req, q, nq)
+
+        if active_only:  # if set active only check every segment activity
+            return await self._scan_active(
+                res, lambda seg: self.__seg_active(seg, params), workers)
+        else:
+            return res
+
+    async def get_segment_matrix(self, factor_lst=None, evt_lst=None,
+                                 segments=None, q=None, nq=None,
+                                 with_date=True, per_user=False, params=None,
+                                 tax=None, workers=8, as_array=False):
+        ''' Request KPI factors and events for few segments concurrently '''
+
+        params = params or dict(self.defaults) # request params
+        factor_lst = list(factor_lst or [])
+        evt_lst = list(evt_lst or [])
+        if not (factor_lst or evt_lst):
+            return {}
+
+        if segments is None:
+            segments = await self.get_segment_lst(q, nq, params=dict(params))
+
+        async def get_func(task):
+            seg, name, is_evt = task
+            seg_params = dict(params)
+            seg_params['segment'] = seg
+            if is_evt:
+                data = await self.get_evt_stat(name, per_user=per_user,
+                                               params=seg_params)
+                return list(data.values())[0] if data else None
+            elif per_user:
+                return await self.get_kpi_dau(name, params=seg_params,
+                                              tax=tax)
+            else:
+                return await self.get_kpi(name, params=seg_params, tax=tax)
+
+        tasks = self._segment_tasks(segments, factor_lst, evt_lst)
+        data_lst = await self._gather([get_func(task) for task in tasks],
+                                      workers)
+
+        return self._segment_matrix_data(segments, factor_lst + evt_lst,
+                                         data_lst, with_date, as_array)
+
+    ### --- Activity checks --- ###
+    async def __evt_active(self, evt, params):
+        ''' Check does event was triggered at least once '''
+
+        data = await self.get_evt_stat(evt, with_date=False,
+                                       params=dict(params))
+        if not data:  # no data for event
+            return False
+
+        return any(list(data.values())[0])
+
+    async def __seg_active(self, seg, params):
+        ''' Check does segment has users at least on one day '''
+
+        seg_params = dict(params)
+        seg_params['segment'] = seg
+
+        return any(await self.get_dau(seg_params) or [])
+
+    async def _scan_active(self, items, check, workers=None):
+        '''
+        Return list with items for which check(item) is True, order is kept
+        # workers - max count of simultaneous checks
+        '''
+
+        active = await self._gather([check(item) for item in items], workers)
+        return [item for item, ok in zip(items, active) if ok]
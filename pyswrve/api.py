@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
-import requests, re, sys, os.path
+import sys, os.path
 from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+from pyswrve import expr
+from pyswrve.cache import ResponseCache, SingleFlightCache
+from pyswrve.errors import RateLimitError, SwrveAPIError, SwrveHTTPError
+from pyswrve.fastjson import iter_array, loads
+from pyswrve.metrics import endpoint
+from pyswrve.query import QueryFilter
+from pyswrve.series import TimeSeries
+from pyswrve.transport import Transport
+from pyswrve.windows import merge_responses, split_range
 
 if sys.version_info[0] < 3:  # Python 2
     from ConfigParser import SafeConfigParser
@@ -29,14 +42,53 @@ class SwrveSession(object):
 
     kpi_factors = tuple(kpi_factors)  # convert list to tuple
 
-    # INI config file parser
-    __prs = SafeConfigParser()
+    # Export API host, can be changed to proxy or local stub server
+    base_url = 'https://dashboard.swrve.com'
+
+    # Seconds while cached DAU of history period (current_month, ...) is
+    # valid, dates of period move and last day is updated
+    history_dau_ttl = 600
 
     def __init__(self, api_key=None, personal_key=None, history=None,
                  start=None, stop=None, segment=None, section=None,
-                 conf_path=None):
+                 conf_path=None, transport=None, timeout=None,
+                 pool_maxsize=None, cache=None, rate_limiter=None,
+                 window=None, window_workers=4, window_retries=2,
+                 hooks=None, base_url=None):
 
         self.section = section or 'defaults'
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+
+        # INI config file parser, own for every session so sessions with
+        # different keys don't overwrite each other
+        self.__prs = SafeConfigParser()
+
+        # Pooled keep-alive connections shared by all export calls
+        # rate_limiter - transport.RateLimiter, can be shared by few sessions
+        # hooks - metrics.Hooks object which gets requests and caches events
+        if transport is None:
+            transport = Transport(pool_maxsize=pool_maxsize or 16,
+                                  timeout=timeout or (10, 300),
+                                  rate_limiter=rate_limiter, hooks=hooks)
+        self.transport = transport
+        self.hooks = transport.hooks
+
+        # DAU series shared by all per user computations
+        self.dau_cache = SingleFlightCache('dau', self.hooks)
+
+        # Long dates ranges are split by windows requested concurrently
+        # window - 'week', 'month', 'quarter', 'year' or count of days
+        self.window = window
+        self.window_workers = window_workers
+        self.window_retries = window_retries
+
+        # On-disk cache of time series, ResponseCache object or True
+        if cache is True:
+            cache = ResponseCache()
+        if cache is not None and cache.hooks is None:
+            cache.hooks = self.hooks
+        self.response_cache = cache
 
         # If not set on constructor load api and personal keys from config
         if not (api_key and personal_key):
@@ -57,7 +109,8 @@ Selected section not found, please set api key and personal key manually')
             api_key = self.__prs.get(self.section, 'api_key')
             personal_key = self.__prs.get(self.section, 'personal_key')
         else:
-            self.__prs.add_section(self.section)
+            if not self.__prs.has_section(self.section):
+                self.__prs.add_section(self.section)
             self.__prs.set(self.section, 'api_key', api_key)
             self.__prs.set(self.section, 'personal_key', personal_key)
 
@@ -128,58 +181,228 @@ Selected section not found, please set api key and personal key manually')
 
         q, nq = self.__prepare_queries(q, nq)
 
-        res = []
-        if q and nq:  # if both queries were set
-            ok_res = []
-            bad_res = []
-            for item in data:
-                for qi in q:  # if item match with query from q
-                    if re.findall(qi, item, re.IGNORECASE):
-                        ok_res.append(item)  # add to ok_res
-
-                for nqi in nq:  # if match with query from nq
-                    if re.findall(nqi, item, re.IGNORECASE):
-                        bad_res.append(item)  # add to bad_res
-
-            # Add items from ok_res to res if them not in bad_res
-            if bad_res:
-                for item in ok_res:
-                    if item not in bad_res:
-                        res.append(item)
-            else:
-                res = ok_res
+        # Compiled filter, duplicates are removed and order is kept
+        return QueryFilter.get(q, nq).filter(data)
 
-        elif q:  # only q was set
-            for item in data:
-                for qi in q:  # check with every query from q list
-                    if re.findall(qi, item, re.IGNORECASE):
-                        res.append(item)
+    def __evt_active(self, evt, params):
+        ''' Check does event was triggered at least once '''
 
-        elif nq:  # only nq was set
-            for item in data:
-                for nqi in nq:  # check with every query from nq list
-                    if not re.findall(nqi, item, re.IGNORECASE):
-                        res.append(item)
+        data = self.get_evt_stat(evt, with_date=False, params=dict(params))
+        if not data:  # no data for event
+            return False
 
-        return res
+        # any() stops on first non-zero day
+        return any(list(data.values())[0])
+
+    def __seg_active(self, seg, params):
+        ''' Check does segment has users at least on one day '''
+
+        seg_params = dict(params)  # own params copy, defaults aren't changed
+        seg_params['segment'] = seg
+
+        return any(self.get_dau(seg_params) or [])
+
+    def _scan_active(self, items, check, workers=None):
+        '''
+        Return list with items for which check(item) is True, order is kept
+        # workers - count of threads, if not set items are checked one by one
+        '''
+
+        active = self._map(check, items, workers)
+        return [item for item, ok in zip(items, active) if ok]
+
+    @staticmethod
+    def _map(func, items, workers=None):
+        '''
+        Call func for every item in thread pool, async session uses _gather
+        # workers - max count of threads, if not set items are processed
+        # one by one
+        Return list with results in the same order as items
+        '''
+
+        items = list(items)
+        if workers and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers,
+                                                    len(items))) as pool:
+                return list(pool.map(func, items))
+        return [func(item) for item in items]
+
+    def _dau_key(self, params):
+        ''' Return DAU cache key for params, apps differ by api_key '''
+
+        return tuple(params.get(k) for k in ('api_key', 'start', 'stop',
+                                             'history', 'segment'))
+
+    def _dau_ttl(self, params):
+        ''' Return seconds while DAU for params is valid or None '''
+
+        if params.get('history'):
+            return self.history_dau_ttl
+
+    def _url(self, path):
+        ''' Return export API url for path like 'kpi/dau.json' '''
+
+        return '%s/api/1/exporter/%s' % (self.base_url, path)
+
+    def _request(self, url, params, series=False):
+        '''
+        Do request with pooled transport and decode json. Return decoded data.
+        Raise errors.SwrveError subclass if request was failed
+        # series - response is a list of time series, it can be cached by
+        # days and long dates range can be split by windows
+        '''
+
+        if not series:
+            return self._get_json(url, params)
+        elif self.response_cache is not None:
+            return self.response_cache.fetch(
+                url, params, lambda p: self._request_windows(url, p))
+        else:
+            return self._request_windows(url, params)
+
+    def _windows(self, params):
+        ''' Return list of (start, stop) windows or None if no split '''
+
+        if not self.window or params.get('history') or not (
+                params.get('start') and params.get('stop')):
+            return
+
+        windows = split_range(params['start'], params['stop'], self.window)
+        if len(windows) > 1:
+            return windows
+
+    def _request_windows(self, url, params):
+        '''
+        Request time series, long dates range is split by self.window and
+        windows are requested concurrently. Failed windows are requested
+        again up to self.window_retries times, other windows are kept
+        '''
+
+        windows = self._windows(params)
+        if not windows:
+            return self._get_json(url, params)
+
+        def get_func(window):
+            window_params = dict(params)
+            window_params['start'], window_params['stop'] = window
+            try:
+                return self._get_json(url, window_params)
+            except (SwrveHTTPError, RequestException) as e:
+                return e  # api errors aren't retried and raised at once
+
+        parts = [None] * len(windows)
+        todo = list(range(len(windows)))
+        for attempt in range(self.window_retries + 1):
+            res = self._map(get_func, [windows[i] for i in todo],
+                            self.window_workers)
+            for i, part in zip(todo, res):
+                parts[i] = part
+            todo = [i for i in todo if isinstance(parts[i], Exception)]
+            if not todo:
+                break
+
+        if todo:  # some windows are failed after all retries
+            raise parts[todo[0]]
+
+        return merge_responses(parts, windows)
+
+    def _get_json(self, url, params):
+        ''' Do request and decode json, no cache and windows are used '''
+
+        resp = self.transport.get(url, params=params)
+        try:
+            req = loads(resp.content)  # orjson / ujson if installed
+        except ValueError:  # not json, html error page for example
+            req = None
+
+        return self._check_response(req, url, resp.status_code)
+
+    def _iter_json(self, url, params):
+        '''
+        Do streamed request and yield items of response array one by one,
+        response isn't kept in memory. No cache and windows are used
+        Raise errors.SwrveError subclass if request was failed
+        '''
+
+        resp = self.transport.get(url, params=params, stream=True)
+        if resp.status_code != 200:
+            try:
+                req = loads(resp.content)
+            except ValueError:
+                req = None
+            self._check_response(req, url, resp.status_code)
+
+        loaded = [0]
+
+        def chunks():
+            for chunk in resp.iter_content(chunk_size=65536):
+                loaded[0] += len(chunk)
+                yield chunk
+
+        try:
+            for item in iter_array(chunks()):
+                if type(item) == dict and 'error' in item:
+                    self._check_response(item, url, resp.status_code)
+                yield item
+        finally:  # generator can be closed before end of response
+            resp.close()
+            self.hooks.transferred(endpoint(url), loaded[0])
+
+    def _check_response(self, req, url=None, status=200):
+        '''
+        Return decoded response
+        Raise errors.SwrveError subclass if swrve returned error
+        '''
+
+        # Request errors
+        if type(req) == dict and 'error' in req.keys():
+            e = SwrveAPIError(req['error'], url, status)
+            if status < 400:  # error statuses are counted by transport
+                self.hooks.error(endpoint(url or ''), e)
+            raise e
+        elif status == 429:
+            raise RateLimitError('Too many requests', url, status)
+        elif status >= 400:
+            raise SwrveHTTPError('Request failed', url, status)
+        elif req is None:
+            raise SwrveHTTPError('Response is not json', url, status)
+
+        return req
 
     ### --- Options --- ###
     def save_defaults(self):
         ''' Save default params from config file '''
 
         conf_path = os.path.join(os.path.expanduser('~'), '.pyswrve')
+
+        # Sections of other apps saved before are kept
+        prs = SafeConfigParser()
+        prs.read(conf_path)
+        for section in self.__prs.sections():
+            if not prs.has_section(section):
+                prs.add_section(section)
+            for k, v in self.__prs.items(section):
+                prs.set(section, k, v)
+
         with open(conf_path, 'w') as f:
-            self.__prs.write(f)
+            prs.write(f)
+
+    def close(self):
+        ''' Close pooled connections of session transport '''
+
+        self.transport.close()
 
     def set_param(self, param, val):
         '''
         Change value of param defined on object creation or set one new
         '''
 
-        if param == 'api_key':
-            self.__prs.set(self.section, 'api_key', param)
-        elif param == 'personal_key':
-            self.__prs.set(self.section, 'personal_key', param)
+        if param in ('api_key', 'personal_key'):
+            if not self.__prs.has_section(self.section):
+                self.__prs.add_section(self.section)
+            self.__prs.set(self.section, param, val)
+            if param == 'api_key':  # cached DAU belongs to other app
+                self.dau_cache.invalidate()
 
         self.defaults[param] = val
 
@@ -214,22 +437,392 @@ Selected section not found, please set api key and personal key manually')
 
     ### --- KPI --- ###
     def get_kpi(self, factor, with_date=True, currency=None, params=None,
-                tax=None):
-        ''' Request KPI factor data from swrve. Return list. '''
+                tax=None, as_array=False):
+        '''
+        Request KPI factor data from swrve. Return list.
+        # as_array - return series.TimeSeries instead of list
+        '''
+
+        url, params = self._kpi_request(factor, currency, params)
+        req = self._request(url, params, series=True)
+
+        return self._kpi_data(req, factor, with_date, tax, as_array)
+
+    def get_dau(self, params=None):
+        '''
+        Request DAU values without dates. Return list.
+        Results are cached by api_key, start, stop, history and segment
+        params, DAU of history period expires in history_dau_ttl seconds
+        '''
+
+        params = params or self.defaults
+        key = self._dau_key(params)
+
+        dau = self.dau_cache.get(key, lambda: self.get_kpi('dau', False,
+                                                           params=dict(params)),
+                                 self._dau_ttl(params))
+        return list(dau)  # copy, cached list must not be changed
+
+    def invalidate_dau_cache(self, params=None):
+        '''
+        Remove DAU for params dates and segment from cache
+        If params not set remove all cached DAU
+        '''
+
+        if params is None:
+            self.dau_cache.invalidate()
+        else:
+            self.dau_cache.invalidate(self._dau_key(params))
+
+    def get_kpi_dau(self, factor, with_date=True, currency=None, params=None,
+                    tax=None, dau=None, as_array=False):
+        '''
+        Request data for KPI factor / DAU (per one user). Return list.
+        # dau - already requested DAU values for the same dates, if not set
+        # DAU will be requested
+        # as_array - return series.TimeSeries instead of list
+        '''
+
+        url, params = self._kpi_request(factor, currency, params)
+        if dau is None:
+            dau = self.get_dau(params)
+        req = self._request(url, params, series=True)
+
+        return self._kpi_dau_data(req, factor, dau, with_date, tax, as_array)
+
+    def get_few_kpi(self, factor_lst, with_date=True, per_user=False,
+                    currency=None, params=None, tax=None, workers=None,
+                    as_array=False):
+        '''
+        Request data for few different KPI factors. Return list.
+        # workers - count of threads for concurrent requests, if not set
+        # factors are requested one by one
+        # as_array - return series.TimeSeries with column per factor
+        '''
+
+        params = params or dict(self.defaults) # request params
+        if currency:
+            params['currency'] = currency  # cash, coins, etc...
+
+        def get_func(task):
+            # Every request gets own params copy, safe for threads
+            if task is None:  # the same DAU for all factors
+                return self.get_dau(dict(params))
+            factor, with_date = task
+            if per_user:  # divided by DAU when all requests are done
+                url, task_params = self._kpi_request(factor, None,
+                                                     dict(params))
+                return self._request(url, task_params, series=True)
+            else:
+                return self.get_kpi(factor, with_date, params=dict(params),
+                                    tax=tax, as_array=as_array)
+
+        # First factor with dates (if needed), other only values
+        dates_lst = [with_date] + [False] * (len(factor_lst) - 1)
+        tasks = list(zip(factor_lst, dates_lst))
+
+        # DAU is requested once in the same pool as factors
+        data_lst = self._map(get_func, tasks + [None] if per_user else tasks,
+                             workers)
+        if per_user:
+            dau = data_lst.pop()
+            data_lst = [self._kpi_dau_data(req, factor, dau, wd, tax, as_array)
+                        for req, (factor, wd) in zip(data_lst, tasks)]
+
+        return self._few_kpi_data(data_lst, factor_lst, with_date, as_array)
+
+    def get_derived(self, exprs, with_date=True, params=None, variables=None,
+                    workers=8, ndigits=4, as_array=False):
+        '''
+        Calculate derived KPI from expressions like
+        'dollar_revenue * (1 - tax) / dau' or 'event("purchase") / dpu',
+        see expr module for syntax. Every distinct base series (KPI factor,
+        event count, item sales) is requested once for all expressions
+        # exprs - dict {metric name: expression} or list with expressions
+        # variables - dict with constants like {'tax': 0.3}
+        # workers - max count of simultaneous requests
+        Return list like get_few_kpi returns, column per expression
+        # as_array - return series.TimeSeries where series names are metrics
+        '''
+
+        return expr.evaluate(self, exprs, with_date, params, variables,
+                             workers, ndigits, as_array)
+
+    ### --- Events --- ###
+    def get_evt_lst(self, q=None, nq=None, params=None, active_only=None,
+                    workers=None):
+        '''
+        Request list with all events from swrve
+        # q - query when item saves if match with query
+        # nq - query when item saves if NOT match with query
+        # workers - count of threads for active_only checks
+        Return list
+        '''
+
+        # Request url
+        url = self._url('event/list')
+        params = params or dict(self.defaults) # request params
+
+        req = self._request(url, params)  # do request
+
+        res = self._lst_data(req, q, nq)
+
+        if active_only:  # if set active only check every event
+            # Events are checked for all users, without segment
+            evt_params = dict(params)
+            evt_params['segment'] = None
+            return self._scan_active(res, lambda evt: self.__evt_active(
+                evt, evt_params), workers)
+        else:
+            return res
+
+    def get_payload_lst(self, ename=None, q=None, nq=None, params=None):
+        '''
+        Request payloads list for event
+        # q - query when item saves if match with query
+        # nq - query when item saves if NOT match with query
+        Return list
+        '''
+
+        # Request url
+        url = self._url('event/payloads')
+        params = params or dict(self.defaults) # request params
+        if ename:
+            params['name'] = ename
+
+        req = self._request(url, params)  # do request
+
+        return self._lst_data(req, q, nq)
+
+    def get_evt_stat(self, ename=None, payload=None, payload_val=None,
+                     payload_sum=None, with_date=True, per_user=False,
+                     params=None, as_array=False, stream=False):
+        '''
+        Request events triggering count with(out) payload key. Return dict.
+        If with payload, keys are payload's values, else key is an event name.
+        # as_array - return series.TimeSeries where series names are keys
+        # stream - parse payload values one by one while response is
+        # downloaded, big response isn't kept in memory and payload_val
+        # request is stopped when value is found. Streamed responses
+        # aren't cached and aren't split by windows
+        '''
+
+        if (payload_val or payload_sum) and not payload:
+            print('\
+If you use payload value or sum then you need to set payload too')
+            return
+
+        url, params = self._evt_stat_request(ename, payload, params)
+        if stream and payload:
+            return self._evt_stat_stream(self._iter_json(url, params),
+                                         payload_val, payload_sum, with_date,
+                                         as_array)
+        req = self._request(url, params, series=True)
+
+        dau = None
+        if per_user and not payload:  # calc for one user
+            dau = self.get_dau(params)
+
+        return self._evt_stat_data(req, payload, payload_val, payload_sum,
+                                   with_date, dau, as_array)
+
+    def get_evt_stat_bulk(self, specs, with_date=True, params=None, workers=8,
+                          as_array=False):
+        '''
+        Request triggering counts for many events and payload keys
+        concurrently, the same (event, payload key) pair is requested once
+        # specs - list with event names or tuples (event, payload key) and
+        # (event, payload key, payload value or list of values)
+        # workers - max count of simultaneous requests
+        Return dict where key is (event, payload key, payload value) tuple,
+        payload key and value are None for specs without payload
+        # as_array - return series.TimeSeries where series names are keys
+        '''
+
+        specs, tasks = self._evt_specs(specs)
+        params = params or dict(self.defaults) # request params
+
+        def get_func(task):
+            url, task_params = self._evt_stat_request(task[0], task[1],
+                                                      dict(params))
+            return self._request(url, task_params, series=True)
+
+        req_lst = self._map(get_func, tasks, workers)
+
+        return self._evt_bulk_data(specs, dict(zip(tasks, req_lst)),
+                                   with_date, as_array)
+
+    ### --- Items & Resources --- ###
+    def get_item_sales(self, item=None, tag=None, currency=None, revenue=True,
+                       with_date=True, per_user=False, params=None,
+                       as_array=False):
+        '''
+        Request count of item sales or revenue from items sales
+        Return dict where key is 'item name - currency'
+        # as_array - return series.TimeSeries where series names are keys
+        '''
+
+        url, params = self._item_sales_request(item, tag, currency, revenue,
+                                               params)
+        req = self._request(url, params, series=True)
+
+        dau = None
+        if per_user:  # calc for one user
+            dau = self.get_dau(params)
+
+        return self._item_sales_data(req, with_date, dau, as_array)
+
+    def get_item_matrix(self, items=None, tags=None, currencies=None,
+                        revenue=True, sales=True, with_date=True,
+                        per_user=False, params=None, workers=8,
+                        as_array=False):
+        '''
+        Request revenue and / or sales count for few items, tags and
+        currencies concurrently, DAU is requested once for per user values
+        # items, tags - lists with items uids and tags, all items if not set
+        # currencies - list with currencies, all currencies if not set
+        # workers - max count of simultaneous requests
+        Return dict where key is ('revenue' or 'sales', item, currency)
+        # as_array - return series.TimeSeries (days x series matrix)
+        # where series names are keys
+        '''
+
+        params = params or dict(self.defaults) # request params
+        tasks = self._item_tasks(items, tags, currencies, revenue, sales)
+
+        def get_func(task):
+            if task is None:  # the same DAU for all items
+                return self.get_dau(dict(params))
+            kind, item, tag, currency = task
+            url, task_params = self._item_sales_request(
+                item, tag, currency, kind == 'revenue', dict(params))
+            return self._request(url, task_params, series=True)
+
+        # DAU is requested once in the same pool as items
+        req_lst = self._map(get_func, tasks + [None] if per_user else tasks,
+                            workers or 1)
+
+        dau = req_lst.pop() if per_user else None
+        return self._item_matrix_data(tasks, req_lst, with_date, dau,
+                                      as_array)
+
+    ### --- Segments --- ###
+    def get_segment_lst(self, q=None, nq=None, params=None, active_only=None,
+                        workers=None):
+        '''
+        Request list with all segments from swrve
+        # q - query when item saves if match with query
+        # nq - query when item saves if NOT match with query
+        # workers - count of threads for active_only checks
+        Return list
+        '''
+
+        # Request url
+        url = self._url('segment/list')
+        params = params or dict(self.defaults) # request params
+
+        req = self._request(url, params)  # do request
+
+        res = self._lst_data(req, q, nq)
+
+        if active_only:   # if set active only check every
+            return self._scan_active(  # segment activity
+                res, lambda seg: self.__seg_active(seg, params), workers)
+        else:
+            return res
+
+    def get_segment_matrix(self, factor_lst=None, evt_lst=None, segments=None,
+                           q=None, nq=None, with_date=True, per_user=False,
+                           params=None, tax=None, workers=8, as_array=False):
+        '''
+        Request KPI factors and events triggering counts for few segments
+        concurrently, every request has own params copy with segment
+        # segments - list of segments, if not set segments list is requested
+        # from swrve and filtered by q / nq queries
+        # workers - max count of simultaneous requests
+        Return dict where key is segment and value is list like get_few_kpi
+        returns, columns are factors and then events
+        '''
+
+        params = params or dict(self.defaults) # request params
+        factor_lst = list(factor_lst or [])
+        evt_lst = list(evt_lst or [])
+        if not (factor_lst or evt_lst):
+            return {}
+
+        if segments is None:
+            segments = self.get_segment_lst(q, nq, params=dict(params))
+
+        def get_func(task):
+            seg, name, is_evt = task
+            seg_params = dict(params)
+            seg_params['segment'] = seg
+            if is_evt:
+                data = self.get_evt_stat(name, per_user=per_user,
+                                         params=seg_params)
+                return list(data.values())[0] if data else None
+            elif per_user:
+                return self.get_kpi_dau(name, params=seg_params, tax=tax)
+            else:
+                return self.get_kpi(name, params=seg_params, tax=tax)
+
+        tasks = self._segment_tasks(segments, factor_lst, evt_lst)
+        data_lst = self._map(get_func, tasks, workers)
+
+        return self._segment_matrix_data(segments, factor_lst + evt_lst,
+                                         data_lst, with_date, as_array)
+
+    ### --- Requests & responses processing --- ###
+    # Shared by sync and async sessions, network isn't used here
+    def _segment_tasks(self, segments, factor_lst, evt_lst):
+        ''' Return list with (segment, name, is event) tasks '''
+
+        return [(seg, name, is_evt) for seg in segments
+                for name, is_evt in [(i, False) for i in factor_lst] +
+                [(i, True) for i in evt_lst]]
+
+    def _segment_matrix_data(self, segments, names, data_lst, with_date=True,
+                             as_array=False):
+        '''
+        Join columns of segments, every segment columns follow each other
+        [seg1 f1, seg1 f2, ..., seg2 f1, ...]
+        '''
+
+        results = {}
+        for i, seg in enumerate(segments):
+            cols = data_lst[i*len(names):(i+1)*len(names)]
+            if as_array:
+                results[seg] = TimeSeries.join(
+                    [TimeSeries.from_data(col) for col in cols], names)
+            elif with_date:
+                results[seg] = [[day[0]] + [col[j][1] for col in cols]
+                                for j, day in enumerate(cols[0])]
+            else:
+                results[seg] = [[col[j][1] for col in cols]
+                                for j in range(len(cols[0]))]
+
+        return results
+
+    def _kpi_request(self, factor, currency=None, params=None):
+        ''' Return url and params for KPI factor request '''
 
         # Request url
-        url = 'https://dashboard.swrve.com/api/1/exporter/kpi/%s.json' % factor
+        url = self._url('kpi/%s.json' % factor)
         params = params or dict(self.defaults) # request params
         if currency:
             params['currency'] = currency  # cash, coins, etc...
 
-        req = requests.get(url, params=params).json()
+        return url, params
 
-        # Request errors
-        if type(req) == dict:
-            if 'error' in req.keys():
-                print('Error: %s' % req['error'])
-                return
+    def _kpi_data(self, req, factor, with_date=True, tax=None,
+                  as_array=False):
+        ''' Process KPI factor response '''
+
+        if as_array:
+            data = TimeSeries.from_data(req[0]['data'], factor)
+            if tax and (factor in self.kpi_taxable):
+                data = data.apply_tax(tax).round(2)
+            return data
 
         if not with_date:  # without date
             if tax and (factor in self.kpi_taxable):  # with tax
@@ -246,22 +839,17 @@ Selected section not found, please set api key and personal key manually')
 
         return data
 
-    def get_kpi_dau(self, factor, with_date=True, currency=None, params=None,
-                    tax=None):
-        ''' Request data for KPI factor / DAU (per one user). Return list. '''
-
-        # Request url
-        url = 'https://dashboard.swrve.com/api/1/exporter/kpi/%s.json' % factor
-        params = params or dict(self.defaults) # request params
-        if currency:
-            params['currency'] = currency  # cash, coins, etc...
-
-        dau = self.get_kpi('dau', False, currency, params)
-        if not dau:  # dau will be None if request was failed with error
-            return   # because error already was printed just return
-        req = requests.get(url, params=params).json()
+    def _kpi_dau_data(self, req, factor, dau, with_date=True, tax=None,
+                      as_array=False):
+        ''' Process KPI factor response, divide values by DAU '''
 
         fdata = req[0]['data']  # factor data
+        if as_array:
+            data = TimeSeries.from_data(fdata, factor).per_user(dau)
+            if tax and (factor in self.kpi_taxable):
+                data = data.apply_tax(tax)
+            return data.round(4)
+
         data = []
         if not with_date:  # without date
             for i in range(len(dau)):
@@ -290,114 +878,41 @@ Selected section not found, please set api key and personal key manually')
 
         return data
 
-    def get_few_kpi(self, factor_lst, with_date=True, per_user=False,
-                    currency=None, params=None, tax=None):
-        ''' Request data for few different KPI factors. Return list. '''
-
-        params = params or dict(self.defaults) # request params
-        if currency:
-            params['currency'] = currency  # cash, coins, etc...
+    def _few_kpi_data(self, data_lst, factor_lst, with_date=True,
+                      as_array=False):
+        '''
+        Merge few KPI factors data to one list (or TimeSeries)
+        First factor data is with dates (if needed), other only values
+        '''
 
-        if per_user:
-            get_func = self.get_kpi_dau
-        else:
-            get_func = self.get_kpi
+        if as_array:
+            return TimeSeries.join(data_lst, list(factor_lst))
 
-        count_index = 0
         results = []
-        for factor in factor_lst:
+        for count_index, data in enumerate(data_lst):
             if not count_index:  # == 0
 
                 if with_date:
-                    results = get_func(factor, tax=tax)
+                    results = data
                 else:
-                    results = [[i] for i in get_func(factor, False, tax=tax)]
-                count_index += 1
+                    results = [[i] for i in data]
 
             else:  # > 0
-                data = get_func(factor, False, tax=tax)
                 for i in range(len(data)):
                     results[i] += [data[i]]
 
         return results
 
-    ### --- Events --- ###
-    def get_evt_lst(self, q=None, nq=None, params=None, active_only=None):
-        '''
-        Request list with all events from swrve
-        # q - query when item saves if match with query
-        # nq - query when item saves if NOT match with query
-        Return list
-        '''
-
-        # Request url
-        url = 'https://dashboard.swrve.com/api/1/exporter/event/list'
-        params = params or dict(self.defaults) # request params
-
-        req = requests.get(url, params=params).json()  # do request
-        # Request errors
-        if type(req) == dict:
-            if 'error' in req.keys():
-                print('Error: %s' % req['error'])
-                return
-
-        if not (q or nq):  # if not specifed query return all list
-            res = req
-        else:
-            res = self.__parse_lst_by_query(req, q, nq)
-
-        if active_only:  # if set active only check every event
-            results = []
-            current_seg = self.defaults['segment']
-            self.set_param('segment', None)
-            for evt in res:
-                val = sum(self.get_evt_stat(evt, with_date=False)[evt])
-                if val:
-                    results.append(evt)
-            self.set_param('segment', current_seg)
-
-            return results
-        else:
-            return res
-
-    def get_payload_lst(self, ename=None, q=None, nq=None, params=None):
-        '''
-        Request payloads list for event
-        # q - query when item saves if match with query
-        # nq - query when item saves if NOT match with query
-        Return list
-        '''
-
-        # Request url
-        url = 'https://dashboard.swrve.com/api/1/exporter/event/payloads'
-        params = params or dict(self.defaults) # request params
-        if ename:
-            params['name'] = ename
-
-        req = requests.get(url, params=params).json()  # do request
-        # Request errors
-        if type(req) == dict:
-            if 'error' in req.keys():
-                print('Error: %s' % req['error'])
-                return
+    def _lst_data(self, req, q=None, nq=None):
+        ''' Filter events, payloads or segments list by queries '''
 
         if not (q or nq):  # if not specifed query return all list
             return req
         else:
             return self.__parse_lst_by_query(req, q, nq)
 
-    def get_evt_stat(self, ename=None, payload=None, payload_val=None,
-                     payload_sum=None, with_date=True, per_user=False,
-                     params=None):
-        '''
-        Request events triggering count with(out) payload key. Return dict.
-        If with payload, keys are payload's values, else key is an event name.
-        '''
-
-        if (payload_val or payload_sum) and not payload:
-            print('\
-If you use payload value or sum then you need to set payload too')
-            return
+    def _evt_stat_request(self, ename=None, payload=None, params=None):
+        ''' Return url and params for events triggering count request '''
 
         params = params or dict(self.defaults) # request params
         if ename:
@@ -406,16 +921,35 @@ If you use payload value or sum then you need to set payload too')
             params['payload_key'] = payload
 
         if payload:
-            url = 'https://dashboard.swrve.com/api/1/exporter/event/payload'
+            url = self._url('event/payload')
         else:
-            url = 'https://dashboard.swrve.com/api/1/exporter/event/count'
+            url = self._url('event/count')
 
-        req = requests.get(url, params=params).json()  # do request
-        # Request errors
-        if type(req) == dict:
-            if 'error' in req.keys():
-                print('Error: %s' % req['error'])
-                return
+        return url, params
+
+    def _evt_stat_data(self, req, payload=None, payload_val=None,
+                       payload_sum=None, with_date=True, dau=None,
+                       as_array=False):
+        '''
+        Process events triggering count response
+        # dau - DAU values for per user calculation (without payload only)
+        '''
+
+        if as_array:
+            if payload and payload_val:
+                payload_val = str(payload_val)
+                req = [d for d in req if d['payload_value'] == payload_val]
+            if payload:
+                data = TimeSeries.from_dict(dict((d['payload_value'],
+                                                  d['data']) for d in req))
+            else:
+                data = TimeSeries.from_data(req[0]['data'], req[0]['name'])
+                if dau is not None:  # calc for one user
+                    data = data.per_user(dau).round(4)
+
+            if payload and payload_sum:  # aggregate payload values
+                return data.sum()
+            return data
 
         data = {}
         if payload and payload_val:
@@ -438,8 +972,7 @@ If you use payload value or sum then you need to set payload too')
             else:
                 data[req[0]['name']] = req[0]['data']
 
-            if per_user:  # calc for one user
-                dau = self.get_kpi('dau', False, params=params)
+            if dau is not None:  # calc for one user
                 key = list(data.keys())[0]  # one element => first key
                 for i in range(len(dau)):
                     if not with_date:
@@ -469,14 +1002,101 @@ If you use payload value or sum then you need to set payload too')
 
         return data
 
-    ### --- Items & Resources --- ###
-    def get_item_sales(self, item=None, tag=None, currency=None, revenue=True,
-                       with_date=True, per_user=False, params=None):
+    def _evt_stat_stream(self, items, payload_val=None, payload_sum=None,
+                         with_date=True, as_array=False):
         '''
-        Request count of item sales or revenue from items sales
-        Return dict where key is 'item name - currency'
+        Process payload values of events triggering count response one by one
+        # items - iterable with payload values series (streamed response)
         '''
 
+        if payload_val:
+            payload_val = str(payload_val)
+
+        data = {}
+        for d in items:
+            val = d['payload_value']
+            if payload_val and val != payload_val:
+                continue
+
+            if payload_sum and not as_array:  # only sum is kept
+                data[val] = sum(i[1] for i in d['data'])
+            elif with_date or as_array:
+                data[val] = d['data']
+            else:
+                data[val] = [i[1] for i in d['data']]
+
+            if payload_val:  # the rest of response isn't needed
+                if hasattr(items, 'close'):
+                    items.close()
+                break
+
+        if as_array:
+            data = TimeSeries.from_dict(data)
+            return data.sum() if payload_sum else data
+        return data
+
+    def _evt_specs(self, specs):
+        '''
+        Normalize bulk events specs to (event, payload, values) tuples,
+        values is a set with payload values as strings or None for all values
+        Return specs and list with unique (event, payload) pairs to request
+        '''
+
+        res = []
+        tasks = []
+        seen = set()
+        for spec in specs:
+            if not isinstance(spec, (list, tuple)):
+                spec = (spec,)
+            ename = spec[0]
+            payload = spec[1] if len(spec) > 1 else None
+            values = spec[2] if len(spec) > 2 else None
+
+            if values is not None:
+                if payload is None:
+                    raise ValueError('Payload values of %s are set without \
+payload key' % ename)
+                if not isinstance(values, (list, tuple, set, frozenset)):
+                    values = [values]
+                values = frozenset(str(i) for i in values)
+
+            res.append((ename, payload, values))
+            if (ename, payload) not in seen:
+                seen.add((ename, payload))
+                tasks.append((ename, payload))
+
+        return res, tasks
+
+    def _evt_bulk_data(self, specs, responses, with_date=True,
+                       as_array=False):
+        '''
+        Process responses of bulk events request
+        # responses - dict {(event, payload): response}
+        '''
+
+        data = {}
+        for ename, payload, values in specs:
+            for d in responses[(ename, payload)]:
+                if payload is None:
+                    key = (ename, None, None)
+                elif values is None or d['payload_value'] in values:
+                    key = (ename, payload, d['payload_value'])
+                else:
+                    continue
+
+                if with_date or as_array:
+                    data[key] = d['data']
+                else:
+                    data[key] = [i[1] for i in d['data']]
+
+        if as_array:
+            return TimeSeries.from_dict(data)
+        return data
+
+    def _item_sales_request(self, item=None, tag=None, currency=None,
+                            revenue=True, params=None):
+        ''' Return url and params for items sales or revenue request '''
+
         params = params or dict(self.defaults) # request params
         if item:
             params['uid'] = item
@@ -486,29 +1106,78 @@ If you use payload value or sum then you need to set payload too')
             params['currency'] = currency
 
         if revenue:
-            url = 'https://dashboard.swrve.com/api/1/exporter/item/revenue'
+            url = self._url('item/revenue')
         else:
-            url = 'https://dashboard.swrve.com/api/1/exporter/item/sales'
+            url = self._url('item/sales')
 
-        req = requests.get(url, params=params).json()  # do request
-        # Request errors
-        if type(req) == dict:
-            if 'error' in req.keys():
-                print('Error: %s' % req['error'])
-                return
+        return url, params
+
+    def _item_tasks(self, items=None, tags=None, currencies=None,
+                    revenue=True, sales=True):
+        '''
+        Return list with (kind, item, tag, currency) tuples for bulk items
+        requests, kind is 'revenue' or 'sales'
+        '''
+
+        kinds = [k for k, on in (('revenue', revenue), ('sales', sales)) if on]
+        filters = [(i, None) for i in items or []] + \
+            [(None, i) for i in tags or []]
+
+        return [(kind, item, tag, currency) for kind in kinds
+                for item, tag in filters or [(None, None)]
+                for currency in currencies or [None]]
+
+    def _item_matrix_data(self, tasks, req_lst, with_date=True, dau=None,
+                          as_array=False):
+        '''
+        Process responses of bulk items request, the same item can be
+        returned by few tags, it's saved once
+        # dau - DAU values for per user calculation
+        '''
+
+        data = {}
+        for (kind, item, tag, currency), req in zip(tasks, req_lst):
+            for d in req:
+                data.setdefault((kind, d['name'], d['currency']), d['data'])
+
+        if as_array:
+            data = TimeSeries.from_dict(data)
+            if dau is not None:  # one division for all series
+                data = data.per_user(dau).round(4)
+            return data
+
+        for key, series in data.items():
+            if dau is not None:  # calc for one user
+                series = [[i[0], round(i[1] / d, 4) if d else 0]
+                          for i, d in zip(series, dau)]
+            if not with_date:
+                series = [i[1] for i in series]
+            data[key] = series
+
+        return data
+
+    def _item_sales_data(self, req, with_date=True, dau=None, as_array=False):
+        '''
+        Process items sales or revenue response
+        # dau - DAU values for per user calculation
+        '''
 
         data = {}
         for d in req:
             # Key for data dict 'item name - currency'
             k = '%s - %s' % (d['name'], d['currency'])
-            if not with_date:
+            if not with_date and not as_array:
                 data[k] = [i[1] for i in d['data']]
             else:
                 data[k] = d['data']
 
-        if per_user:  # calc for one user
-            dau = self.get_kpi('dau', False, params=params)
+        if as_array:
+            data = TimeSeries.from_dict(data)
+            if dau is not None:  # calc for one user
+                data = data.per_user(dau).round(4)
+            return data
 
+        if dau is not None:  # calc for one user
             for key in data.keys():
                 for i in range(len(dau)):
                     if not with_date:
@@ -524,42 +1193,3 @@ If you use payload value or sum then you need to set payload too')
                             data[key][i][1] = 0
 
         return data
-
-    ### --- Segments --- ###
-    def get_segment_lst(self, q=None, nq=None, params=None, active_only=None):
-        '''
-        Request list with all segments from swrve
-        # q - query when item saves if match with query
-        # nq - query when item saves if NOT match with query
-        Return list
-        '''
-
-        # Request url
-        url = 'https://dashboard.swrve.com/api/1/exporter/segment/list'
-        params = params or dict(self.defaults) # request params
-
-        req = requests.get(url, params=params).json()  # do request
-        # Request errors
-        if type(req) == dict:
-            if 'error' in req.keys():
-                print('Error: %s' % req['error'])
-                return
-
-        if not (q or nq):  # if not specifed query return all list
-            res = req
-        else:
-            res = self.__parse_lst_by_query(req, q, nq)
-
-        if active_only:   # if set active only check every
-            results = []  # segment activity
-            current_seg = self.defaults['segment']
-            for seg in res:
-                self.set_param('segment', seg)
-
-                val = sum(self.get_kpi('dau', with_date=False))
-                if val:
-                    results.append(seg)
-            self.set_param('segment', current_seg)
-            return results
-        else:
-            return res
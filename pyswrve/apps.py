@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import os.path, sys
+
+from pyswrve.api import SwrveSession
+from pyswrve.cache import ResponseCache
+from pyswrve.transport import Transport
+from pyswrve.utils import Downloader
+
+if sys.version_info[0] < 3:  # Python 2
+    from ConfigParser import SafeConfigParser
+else:  # Python 3
+    from configparser import SafeConfigParser
+
+class AppManager(object):
+    '''
+    Sessions of few swrve apps with own keys and one shared transport:
+    connections pool, rate limiter and hooks are common for all apps.
+    The same query is run for all apps concurrently, results are
+    returned in dict where key is app name
+    '''
+
+    def __init__(self, apps=None, sections=None, conf_path=None,
+                 transport=None, pool_maxsize=64, timeout=None,
+                 rate_limiter=None, hooks=None, workers=8, **kwargs):
+
+        # apps - dict {app name: (api_key, personal_key)}
+        # sections - list with sections of config file ($HOME/.pyswrve),
+        # section name is app name. If apps and sections aren't set all
+        # sections except defaults are loaded
+        # transport - transport.Transport shared by all apps, created with
+        # pool_maxsize, timeout, rate_limiter and hooks if not set
+        # workers - max count of apps requested simultaneously
+        # kwargs - other SwrveSession params (cache, window, base_url, ...)
+        if transport is None:
+            transport = Transport(pool_maxsize=pool_maxsize,
+                                  timeout=timeout or (10, 300),
+                                  rate_limiter=rate_limiter, hooks=hooks)
+        self.transport = transport
+        self.workers = workers
+
+        # On-disk cache keys include api_key, one cache is shared by apps
+        if kwargs.get('cache') is True:
+            kwargs['cache'] = ResponseCache()
+        self.kwargs = kwargs
+        self.sessions = {}
+        self.__order = []  # apps names in order of adding
+
+        if apps is None and sections is None:
+            sections = [i for i in self.read_conf(conf_path).sections()
+                        if i != 'defaults']
+        if sections:
+            prs = self.read_conf(conf_path)
+            for section in sections:
+                self.add(section, prs.get(section, 'api_key'),
+                         prs.get(section, 'personal_key'))
+        for name, keys in (apps or {}).items():
+            self.add(name, *keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getitem__(self, name):
+        return self.sessions[name]
+
+    def __iter__(self):
+        return iter(self.__order)
+
+    def __len__(self):
+        return len(self.__order)
+
+    @staticmethod
+    def read_conf(conf_path=None):
+        ''' Return parser with config file ($HOME/.pyswrve by default) '''
+
+        conf_path = conf_path or os.path.join(os.path.expanduser('~'),
+                                              '.pyswrve')
+        prs = SafeConfigParser()
+        prs.read(conf_path)
+        return prs
+
+    @property
+    def names(self):
+        ''' List with apps names '''
+
+        return list(self.__order)
+
+    def add(self, name, api_key, personal_key, **kwargs):
+        '''
+        Add app session which uses shared transport
+        # kwargs - SwrveSession params for this app only
+        Return session
+        '''
+
+        params = dict(self.kwargs)
+        params.update(kwargs)
+        session = SwrveSession(api_key, personal_key, section=name,
+                               transport=self.transport, **params)
+
+        if name not in self.sessions:
+            self.__order.append(name)
+        self.sessions[name] = session
+        return session
+
+    def remove(self, name):
+        ''' Remove app session '''
+
+        del self.sessions[name]
+        self.__order.remove(name)
+
+    def set_dates(self, start=None, stop=None, period=None,
+                  period_count=None):
+        ''' Set the same dates for all apps '''
+
+        for name in self.__order:
+            self.sessions[name].set_dates(start, stop, period, period_count)
+
+    def set_param(self, param, val):
+        ''' Set the same param for all apps '''
+
+        for name in self.__order:
+            self.sessions[name].set_param(param, val)
+
+    def run(self, method, *args, **kwargs):
+        '''
+        Run the same session method for all apps concurrently
+        # method - name of SwrveSession method like 'get_kpi' or function
+        # which gets session as first argument
+        # apps - list with apps names, all apps if not set
+        # return_errors - return exceptions of failed apps as results
+        # instead of raising first one
+        Return dict where key is app name and value is method result
+        '''
+
+        apps = kwargs.pop('apps', None) or self.__order
+        return_errors = kwargs.pop('return_errors', False)
+
+        def get_func(name):
+            session = self.sessions[name]
+            try:
+                if callable(method):
+                    return method(session, *args, **kwargs)
+                return getattr(session, method)(*args, **kwargs)
+            except Exception as e:
+                if not return_errors:
+                    raise
+                return e
+
+        return dict(zip(apps, SwrveSession._map(get_func, apps,
+                                                self.workers)))
+
+    def downloader(self, name, **kwargs):
+        '''
+        Return utils.Downloader with app keys and shared transport
+        # kwargs - other Downloader params
+        '''
+
+        defaults = self.sessions[name].defaults
+        kwargs.setdefault('base_url', self.kwargs.get('base_url'))
+        return Downloader(defaults['api_key'], defaults['personal_key'],
+                          transport=self.transport, **kwargs)
+
+    def close(self):
+        ''' Close shared transport connections '''
+
+        self.transport.close()
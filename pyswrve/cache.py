@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+import json, os.path, sqlite3, threading, time
+from datetime import date, datetime, timedelta
+
+from pyswrve.fastjson import loads
+from pyswrve.windows import series_id
+
+class _Flight(object):
+    ''' Request in progress, shared by all callers of one key '''
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlightCache(object):
+    '''
+    Thread-safe in-memory cache
+    Concurrent callers asking for the same key share one in-flight request
+    '''
+
+    def __init__(self, name='memory', hooks=None):
+
+        # name, hooks - lookups are reported to metrics.Hooks with name
+        self.name = name
+        self.hooks = hooks
+
+        self.__lock = threading.Lock()
+        self.__data = {}
+        self.__expires = {}  # expiration time of keys with ttl
+        self.__flights = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__data)
+
+    def get(self, key, func, ttl=None):
+        '''
+        Return cached value for key or call func to get it
+        None results are not cached
+        # ttl - seconds while value is valid, if not set value never expires
+        '''
+
+        with self.__lock:
+            if self.__expires.get(key, float('inf')) < time.time():
+                self.__data.pop(key, None)
+                del self.__expires[key]
+            if key in self.__data:
+                self.hits += 1
+                self.__report(True)
+                return self.__data[key]
+
+            flight = self.__flights.get(key)
+            if flight is None:  # first caller does request
+                flight = _Flight()
+                self.__flights[key] = flight
+                self.misses += 1
+                owner = True
+            else:  # other callers wait for its result
+                self.hits += 1
+                owner = False
+            self.__report(not owner)
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.__lock:
+                if flight.error is None and flight.result is not None:
+                    self.__data[key] = flight.result
+                    if ttl is not None:
+                        self.__expires[key] = time.time() + ttl
+                del self.__flights[key]
+            flight.event.set()
+
+        return flight.result
+
+    def __report(self, hit):
+        ''' Report lookup to hooks '''
+
+        if self.hooks is not None:
+            self.hooks.cache(self.name, hits=int(hit), misses=int(not hit))
+
+    def invalidate(self, key=None):
+        ''' Remove key from cache, if key not set remove all keys '''
+
+        with self.__lock:
+            if key is None:
+                self.__data.clear()
+                self.__expires.clear()
+            else:
+                self.__data.pop(key, None)
+                self.__expires.pop(key, None)
+
+    def stats(self):
+        ''' Return dict with hits, misses and size counters '''
+
+        with self.__lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.__data)}
+
+class ResponseCache(object):
+    '''
+    Persistent on-disk cache of time series responses (SQLite)
+    Every day datapoint of every series is saved by url, params and date.
+    Days before yesterday never change, recent days are valid for ttl seconds
+    '''
+
+    # Params which define dates range, they are not a part of cache key
+    range_params = ('start', 'stop', 'history')
+
+    def __init__(self, path=None, max_entries=500000, ttl=3600,
+                 mutable_days=2, hooks=None):
+
+        # path - sqlite file path, $HOME/.pyswrve_cache.sqlite by default
+        # max_entries - max count of saved days, least recently used
+        # days are removed when limit is reached
+        # ttl - seconds while saved mutable days are valid
+        # mutable_days - count of last days (today included) which can change
+        # hooks - metrics.Hooks object, lookups are reported in days
+        self.path = path or os.path.join(os.path.expanduser('~'),
+                                         '.pyswrve_cache.sqlite')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mutable_days = mutable_days
+        self.hooks = hooks
+
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__conn:
+            self.__conn.execute('''CREATE TABLE IF NOT EXISTS days (
+key TEXT, day TEXT, label TEXT, data TEXT, fetched REAL, accessed REAL,
+PRIMARY KEY (key, day))''')
+            self.__conn.execute('''CREATE INDEX IF NOT EXISTS days_accessed
+ON days (accessed)''')
+
+    def __key(self, url, params):
+        ''' Return cache key for url and params without dates '''
+
+        items = sorted((k, v) for k, v in params.items() if v is not None and
+                       k not in self.range_params and k != 'personal_key')
+        return url + '?' + json.dumps(items)
+
+    def __load(self, key, days):
+        ''' Return dict {day: (label, data, fetched)} for saved days '''
+
+        res = {}
+        now = time.time()
+        with self.__lock:
+            rows = self.__conn.execute('''SELECT day, label, data, fetched
+FROM days WHERE key = ? AND day >= ? AND day <= ?''', (key, days[0], days[-1]))
+            for day, label, data, fetched in rows:
+                res[day] = (label, loads(data), fetched)
+
+            with self.__conn:
+                self.__conn.execute('''UPDATE days SET accessed = ?
+WHERE key = ? AND day >= ? AND day <= ?''', (now, key, days[0], days[-1]))
+
+        return res
+
+    def __save(self, key, days, req):
+        ''' Split response to days and save them '''
+
+        saved = dict((day, [None, {}]) for day in days)
+        for d in req:
+            # Series id is all series fields except data (name, currency...)
+            sid = series_id(d)
+            for label, val in d['data']:
+                day = saved.setdefault(label[-10:], [None, {}])
+                day[0] = label
+                day[1][sid] = val
+
+        now = time.time()
+        rows = [(key, day, label, json.dumps(data), now, now)
+                for day, (label, data) in saved.items()]
+        with self.__lock:
+            with self.__conn:
+                self.__conn.executemany('''INSERT OR REPLACE INTO days
+VALUES (?, ?, ?, ?, ?, ?)''', rows)
+                self.__evict()
+
+    def __expired(self, day, fetched, first_mutable, now):
+        '''
+        Check does saved day need request: mutable days are valid for ttl
+        seconds, final days are valid if they were fetched after day became
+        final (day + mutable_days), partial values are requested again
+        '''
+
+        if day >= first_mutable:
+            return now - fetched > self.ttl
+
+        final = datetime.strptime(day, '%Y-%m-%d') + \
+            timedelta(days=self.mutable_days)
+        return fetched < time.mktime(final.timetuple())
+
+    @staticmethod
+    def __runs(days, missing):
+        ''' Split missing days to lists of contiguous days '''
+
+        runs = []
+        missing = set(missing)
+        prev = False
+        for day in days:
+            if day in missing:
+                if not prev:
+                    runs.append([])
+                runs[-1].append(day)
+            prev = day in missing
+        return runs
+
+    def __evict(self):
+        ''' Remove least recently used days if there are too many of them '''
+
+        count = self.__conn.execute('SELECT COUNT(*) FROM days').fetchone()[0]
+        if count > self.max_entries:
+            self.__conn.execute('''DELETE FROM days WHERE rowid IN
+(SELECT rowid FROM days ORDER BY accessed LIMIT ?)''',
+                                (count - self.max_entries,))
+
+    def fetch(self, url, params, func):
+        '''
+        Return response for params stitched from saved and requested days
+        # func - function which does request, gets params and returns
+        # decoded response or None if request was failed
+        One request is made for every contiguous run of missing days.
+        Requests with history param or without start & stop aren't cached.
+        '''
+
+        if params.get('history') or not (params.get('start') and
+                                         params.get('stop')):
+            return func(params)
+
+        key = self.__key(url, params)
+        start = datetime.strptime(str(params['start']), '%Y-%m-%d').date()
+        stop = datetime.strptime(str(params['stop']), '%Y-%m-%d').date()
+        days = [str(start + timedelta(days=i))
+                for i in range((stop - start).days + 1)]
+        if not days:
+            return func(params)
+
+        first_mutable = str(date.today() - timedelta(days=self.mutable_days-1))
+        now = time.time()
+        saved = self.__load(key, days)
+        missing = [day for day in days if day not in saved or
+                   self.__expired(day, saved[day][2], first_mutable, now)]
+
+        with self.__lock:
+            self.hits += len(days) - len(missing)
+            self.misses += len(missing)
+        if self.hooks is not None:
+            self.hooks.cache('response', hits=len(days) - len(missing),
+                             misses=len(missing))
+
+        # Every contiguous run of missing days is requested separately
+        for run in self.__runs(days, missing):
+            missing_params = dict(params)
+            missing_params['start'] = run[0]
+            missing_params['stop'] = run[-1]
+            req = func(missing_params)
+            self.__save(key, run, req)
+            saved.update(self.__load(key, run))
+
+        # Stitch series from days, series order is order of first appearance
+        series = []
+        seen = set()
+        for day in days:
+            for sid in saved[day][1]:
+                if sid not in seen:
+                    seen.add(sid)
+                    series.append(sid)
+
+        res = []
+        for sid in series:
+            d = dict(json.loads(sid))
+            d['data'] = [[saved[day][0] or 'D-%s' % day,
+                          saved[day][1].get(sid, 0)] for day in days]
+            res.append(d)
+
+        return res
+
+    def clear(self):
+        ''' Remove all saved days '''
+
+        with self.__lock:
+            with self.__conn:
+                self.__conn.execute('DELETE FROM days')
+
+    def stats(self):
+        ''' Return dict with hits, misses (in days) and size counters '''
+
+        with self.__lock:
+            size = self.__conn.execute('SELECT COUNT(*) FROM days').fetchone()
+            return {'hits': self.hits, 'misses': self.misses, 'size': size[0]}
+
+    def close(self):
+        ''' Close sqlite connection '''
+
+        with self.__lock:
+            self.__conn.close()
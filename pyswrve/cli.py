@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+'''
+Batch runner for job files. Usage:
+
+    pyswrve jobs.yaml [--dry-run] [--workers 16]
+
+Job file (YAML or JSON) is one job or few jobs with shared defaults:
+
+    apps: [app1, app2]        # config file sections or
+                              # {name: [api_key, personal_key]}
+    segments: [null, Payers]  # null is all users
+    dates: {start: 2015-01-01, stop: 2015-01-31}  # or {period: week}
+    variables: {tax: 0.3}
+    jobs:
+      - name: kpi
+        kpi: [dau, dollar_revenue]
+        output: out/kpi.csv   # .csv, .csv.gz, .parquet, .sqlite or .db
+      - name: purchases
+        events: [purchase, [purchase, item, gold_pack]]
+        expressions: {net_arpu: 'dollar_revenue * (1 - tax) / dau'}
+        output: out/purchases.parquet
+
+Queries of all jobs with the same app, segment, dates and variables are
+merged, every base series is requested once (see expr module).
+'''
+
+import argparse, json, os, sys
+from datetime import date, timedelta
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional, needed only for yaml job files
+    yaml = None
+
+from pyswrve import expr
+from pyswrve.api import SwrveSession
+from pyswrve.apps import AppManager
+from pyswrve.export import write
+from pyswrve.sync import SyncStore
+from pyswrve.transport import RateLimiter
+
+# Job keys which are inherited from top level of job file
+JOB_DEFAULTS = ('apps', 'segments', 'dates', 'variables')
+
+# Days in periods of dates spec, the same as SwrveSession.set_dates uses
+PERIODS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+def load_jobs(path):
+    '''
+    Read job file, format is selected by extension (.yaml, .yml or json)
+    Return list with job dicts, defaults are applied
+    '''
+
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError('PyYAML is required for yaml job files')
+            conf = yaml.safe_load(f)
+        else:
+            conf = json.load(f)
+
+    jobs = conf.get('jobs') or [conf]
+    res = []
+    for i, job in enumerate(jobs):
+        job = dict(job)
+        for key in JOB_DEFAULTS:
+            if key not in job and key in conf:
+                job[key] = conf[key]
+        job.setdefault('name', 'job%s' % (i + 1))
+        res.append(job)
+
+    return res
+
+def date_range(dates, today=None):
+    '''
+    Return (start, stop) strings for dates spec:
+    {'start': ..., 'stop': ...} or {'period': 'week', 'period_count': 2},
+    period ends yesterday
+    '''
+
+    dates = dates or {'period': 'week'}
+    if dates.get('start') and dates.get('stop'):
+        return str(dates['start']), str(dates['stop'])
+
+    stop = (today or date.today()) - timedelta(days=1)
+    count = PERIODS[dates.get('period', 'week')] * \
+        int(dates.get('period_count') or 1)
+    return str(stop - timedelta(days=count)), str(stop)
+
+def job_columns(job):
+    '''
+    Return list with (column name, expression) tuples of job:
+    KPI factors, events (name or [name, payload key, payload value])
+    and expressions (dict {name: expression} or list)
+    '''
+
+    res = [(factor, factor) for factor in job.get('kpi') or []]
+    for spec in job.get('events') or []:
+        if not isinstance(spec, (list, tuple)):
+            spec = [spec]
+        args = ', '.join(json.dumps(str(i)) for i in spec)
+        res.append((':'.join(str(i) for i in spec), 'event(%s)' % args))
+
+    exprs = job.get('expressions') or {}
+    if not isinstance(exprs, dict):
+        exprs = dict((i, i) for i in exprs)
+    res += sorted(exprs.items())
+
+    return res
+
+def app_names(apps):
+    ''' Return list with apps names of apps spec (list or dict) '''
+
+    if isinstance(apps, dict):
+        return list(apps.keys())
+    return list(apps or [])
+
+def plan(jobs, today=None):
+    '''
+    Merge queries of jobs
+    Return list with groups, every group is dict with app, segment, start,
+    stop, variables, exprs (distinct expressions), requests (distinct
+    base series requests, see expr.request_keys) and jobs (indexes of jobs
+    which use group)
+    '''
+
+    groups = {}
+    order = []
+    for index, job in enumerate(jobs):
+        start, stop = date_range(job.get('dates'), today)
+        variables = job.get('variables') or {}
+        exprs = [e for name, e in job_columns(job)]
+        for app in app_names(job.get('apps')):
+            for segment in job.get('segments') or [None]:
+                key = (app, segment, start, stop,
+                       json.dumps(variables, sort_keys=True))
+                if key not in groups:
+                    groups[key] = {'app': app, 'segment': segment,
+                                   'start': start, 'stop': stop,
+                                   'variables': variables, 'exprs': [],
+                                   'jobs': []}
+                    order.append(key)
+                group = groups[key]
+                if index not in group['jobs']:
+                    group['jobs'].append(index)
+                group['exprs'] += [e for e in exprs
+                                   if e not in group['exprs']]
+
+    res = []
+    for key in order:
+        group = groups[key]
+        parsed = expr.parse(group['exprs'], group['variables'],
+                            SwrveSession.kpi_factors)
+        group['requests'] = expr.request_keys(expr.dependencies(parsed))
+        res.append(group)
+
+    return res
+
+def print_plan(jobs, groups, out=None):
+    ''' Print request plan of dry run, to stdout if out is not set '''
+
+    out = out or sys.stdout
+    total = 0
+    for group in groups:
+        out.write('%s, %s, %s .. %s: %s requests\n' % (
+            group['app'], group['segment'] or 'all users', group['start'],
+            group['stop'], len(group['requests'])))
+        for key in group['requests']:
+            out.write('    %s\n' % ' '.join(str(i) for i in key
+                                          if i is not None))
+        total += len(group['requests'])
+
+    for job in jobs:
+        out.write('Job %s -> %s\n' % (job['name'], job.get('output') or '-'))
+    out.write('Total: %s requests for %s jobs\n' % (total, len(jobs)))
+
+def run_groups(manager, groups, workers=8):
+    '''
+    Request all groups concurrently
+    # workers - max count of simultaneous requests of all groups, it's
+    # split between groups and requests of every group
+    Return list with results {expression: [[date, value], ...]} or
+    exceptions of failed groups
+    '''
+
+    group_workers = max(1, min(workers, len(groups)))
+    request_workers = max(1, workers // group_workers)
+
+    def run_func(group):
+        session = manager[group['app']]
+        params = dict(session.defaults)
+        params.update(start=group['start'], stop=group['stop'],
+                      history=None, segment=group['segment'])
+        try:
+            data = session.get_derived(group['exprs'], params=params,
+                                       variables=group['variables'],
+                                       workers=request_workers)
+        except Exception as e:
+            return e
+
+        return dict((e, [[row[0], row[i+1]] for row in data])
+                    for i, e in enumerate(group['exprs']))
+
+    return SwrveSession._map(run_func, groups, group_workers)
+
+def job_rows(index, job, groups, results):
+    '''
+    Generate rows [date, app, segment, values...] of job
+    # index - index of job in jobs list of plan
+    '''
+
+    columns = job_columns(job)
+    for group, data in zip(groups, results):
+        if isinstance(data, Exception) or index not in group['jobs']:
+            continue
+        lst = [data[e] for name, e in columns]
+        for items in zip(*lst):
+            yield [items[0][0], group['app'], group['segment'] or ''] + \
+                [i[1] for i in items]
+
+def write_job(index, job, groups, results):
+    ''' Write job results to its output. Return count of rows '''
+
+    path = job.get('output')
+    if not path:
+        return 0
+
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    names = [name for name, e in job_columns(job)]
+    rows = job_rows(index, job, groups, results)
+    if path.endswith(('.sqlite', '.db')):  # the same store as sync uses
+        series = {}
+        count = 0
+        for row in rows:
+            for name, value in zip(names, row[3:]):
+                series.setdefault((row[1], row[2], name), []).append(
+                    [row[0], value])
+            count += 1
+        with SyncStore(path) as store:
+            for (app, segment, name), data in series.items():
+                store.save(app, segment, name, data)
+        return count
+
+    return write(rows, path, ['DATE', 'APP', 'SEGMENT'] + names)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog='pyswrve', description='Run swrve export jobs from job file')
+    parser.add_argument('jobs', help='YAML or JSON job file')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print deduplicated request plan and exit')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='max count of simultaneous requests')
+    parser.add_argument('--rate', type=float,
+                        help='max count of requests per second')
+    parser.add_argument('--conf', help='config file ($HOME/.pyswrve)')
+    parser.add_argument('--base-url')
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.jobs)
+    groups = plan(jobs)
+    if args.dry_run:
+        print_plan(jobs, groups)
+        return 0
+
+    # All apps of all jobs share one connections pool and rate limiter
+    apps = {}
+    sections = []
+    for job in jobs:
+        if isinstance(job.get('apps'), dict):
+            apps.update(job['apps'])
+        else:
+            sections += [i for i in app_names(job.get('apps'))
+                         if i not in sections]
+    rate_limiter = RateLimiter(args.rate) if args.rate else None
+
+    with AppManager(apps, sections or [], args.conf, workers=args.workers,
+                    pool_maxsize=max(16, args.workers),
+                    rate_limiter=rate_limiter,
+                    base_url=args.base_url) as manager:
+        results = run_groups(manager, groups, args.workers)
+
+    status = 0
+    for group, data in zip(groups, results):
+        if isinstance(data, Exception):
+            sys.stderr.write('%s, %s failed: %s\n' % (
+                group['app'], group['segment'] or 'all users', data))
+            status = 1
+    for index, job in enumerate(jobs):
+        count = write_job(index, job, groups, results)
+        print('%s: %s rows -> %s' % (job['name'], count,
+                                     job.get('output') or '-'))
+
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+class SwrveError(Exception):
+    ''' Base class for pyswrve errors '''
+
+    def __init__(self, message, url=None, status=None):
+
+        super(SwrveError, self).__init__(message)
+        self.message = message
+        self.url = url
+        self.status = status
+
+    def __str__(self):
+        if self.status:
+            return '%s (HTTP %s, %s)' % (self.message, self.status, self.url)
+        return self.message
+
+class SwrveAPIError(SwrveError):
+    ''' Swrve returned error message like {"error": "..."} '''
+
+class SwrveHTTPError(SwrveError):
+    ''' Request failed with HTTP error status after all retries '''
+
+class RateLimitError(SwrveHTTPError):
+    ''' Request was throttled (HTTP 429) after all retries '''
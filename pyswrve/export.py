@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import csv, gzip, sys
+from itertools import chain, islice
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, needed only for parquet files
+    pa = None
+
+from pyswrve.series import TimeSeries
+
+# Count of rows written at once
+BATCH_SIZE = 10000
+
+def open_output(path, compress=None):
+    '''
+    Open text file for csv writer
+    # compress - write gzip file, by default if path ends with .gz
+    '''
+
+    if compress is None:
+        compress = path.endswith('.gz')
+
+    if sys.version_info[0] < 3:  # Python 2 csv writes bytes
+        return gzip.open(path, 'wb') if compress else open(path, 'wb')
+    elif compress:
+        return gzip.open(path, 'wt', newline='')
+    else:
+        return open(path, 'w', newline='')
+
+def batches(rows, size=BATCH_SIZE):
+    ''' Split iterable to lists with size items, only one list is in memory '''
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            break
+        yield batch
+
+def table_rows(data, head=None):
+    '''
+    Convert result of any pyswrve method to header and rows iterator
+    # data - list like [['D-2015-01-31', 1.0, ...], ...] or [1.0, ...],
+    # dict {name: [['D-2015-01-31', 1.0], ...]} or {name: [1.0, ...]},
+    # series.TimeSeries or any iterable (generator) with rows
+    # head - header row, for dicts and TimeSeries default is DATE and names
+    Return (head, rows), rows are generated lazily
+    '''
+
+    if isinstance(data, TimeSeries):
+        if head is None:
+            head = ['DATE'] + [str(i) for i in data.names]
+        labels = ('D-%s' % i for i in data.dates.astype(str))
+        rows = ([d] + v.tolist() for d, v in zip(labels, data.values))
+        return head, rows
+
+    elif isinstance(data, dict):
+        keys = list(data.keys())
+        if not keys or not data[keys[0]]:
+            return head, iter([])
+
+        columns = [data[k] for k in keys]
+        if isinstance(columns[0][0], (list, tuple)):  # [DATE, value] items
+            if head is None:
+                head = ['DATE'] + keys
+            rows = ([items[0][0]] + [i[1] for i in items]
+                    for items in zip(*columns))
+        else:  # plain values
+            if head is None:
+                head = keys
+            rows = (list(items) for items in zip(*columns))
+        return head, rows
+
+    # Lists and generators, first row shows are values plain or not
+    rows = iter(data)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return head, iter([])
+
+    rows = chain([first], rows)
+    if not isinstance(first, (list, tuple)):  # [100.0, 125.0, ...]
+        rows = ([i] for i in rows)
+    return head, rows
+
+def long_rows(data):
+    '''
+    Flatten dict {key: rows} (like get_segment_matrix result) to rows
+    with key in first column. Rows are generated lazily
+    '''
+
+    for key, value in data.items():
+        for row in table_rows(value)[1]:
+            yield [key] + list(row)
+
+def write_csv(data, path, head=None, compress=None, batch_size=BATCH_SIZE):
+    '''
+    Write data to csv file by batches, memory usage doesn't depend on
+    count of rows if data is generator
+    # data - result of pyswrve method or iterable with rows, see table_rows
+    # compress - write gzip file, by default if path ends with .gz
+    Return count of written rows
+    '''
+
+    head, rows = table_rows(data, head)
+
+    count = 0
+    with open_output(path, compress) as f:
+        w = csv.writer(f)
+        if head:
+            w.writerow(head)
+        for batch in batches(rows, batch_size):
+            w.writerows(batch)
+            count += len(batch)
+
+    return count
+
+def infer_schema(batch, head):
+    '''
+    Return pyarrow schema for rows of first batch. Integer and empty (None)
+    columns are float64, swrve values are integers on some days and
+    floats on others
+    '''
+
+    fields = []
+    for name, col in zip(head, zip(*batch)):
+        t = pa.array(list(col)).type
+        if pa.types.is_integer(t) or pa.types.is_null(t):
+            t = pa.float64()
+        fields.append(pa.field(str(name), t))
+
+    return pa.schema(fields)
+
+def write_parquet(data, path, head=None, compression='snappy',
+                  batch_size=100000, schema=None):
+    '''
+    Write data to parquet file (requires pyarrow)
+    TimeSeries are written column by column without conversion to rows,
+    other data is written by row groups of batch_size rows
+    # head - column names, by default DATE and names for dicts and
+    # TimeSeries, c0, c1, ... for lists
+    # schema - pyarrow.Schema of rows, inferred from first batch if not set
+    # (see infer_schema), all batches are converted to it
+    Return count of written rows
+    '''
+
+    if pa is None:
+        raise ImportError('pyarrow is required for parquet files')
+
+    if isinstance(data, TimeSeries):
+        names = head or ['DATE'] + [str(i) for i in data.names]
+        columns = [pa.array(data.dates)]
+        columns += [pa.array(data.values[:, i])
+                    for i in range(data.values.shape[1])]
+        pq.write_table(pa.Table.from_arrays(columns, names=names), path,
+                       compression=compression)
+        return len(data)
+
+    head, rows = table_rows(data, head)
+
+    count = 0
+    writer = None
+    try:
+        for batch in batches(rows, batch_size):
+            if schema is None:
+                if head is None:
+                    head = ['c%s' % i for i in range(len(batch[0]))]
+                schema = infer_schema(batch, head)
+            columns = [pa.array(list(col), type=field.type)
+                       for col, field in zip(zip(*batch), schema)]
+            table = pa.Table.from_arrays(columns, schema=schema)
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema,
+                                          compression=compression)
+            writer.write_table(table)
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return count
+
+def write(data, path, head=None, **kwargs):
+    '''
+    Write data to file, format is selected by extension:
+    .parquet (pyarrow), .csv.gz (gzip csv) or csv for others
+    Return count of written rows
+    '''
+
+    if path.endswith('.parquet'):
+        return write_parquet(data, path, head, **kwargs)
+    return write_csv(data, path, head, **kwargs)
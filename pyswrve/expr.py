@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+'''
+Derived KPI expressions over swrve series, for example:
+
+    'dollar_revenue * (1 - tax) / dau'
+    'items_purchased / new_users'
+    'event("purchase") / dpu'
+    'event("level.up", "level", "10") / dau'
+    'revenue("gold_pack", "usd") + revenue("gems_pack", "usd")'
+    'sales("gold_pack") / dau'
+
+Names are KPI factors or variables (constants like tax), event, revenue
+and sales calls are events triggering counts and items sales. Every base
+series is requested once for all expressions.
+'''
+
+import ast, operator, sys
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, pure python is used without it
+    np = None
+
+from pyswrve.series import TimeSeries
+
+# Allowed operators
+_binary = {ast.Add: operator.add, ast.Sub: operator.sub,
+           ast.Mult: operator.mul, ast.Div: operator.truediv,
+           ast.Pow: operator.pow}
+_unary = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+# Series functions and count of their string arguments (min, max)
+_calls = {'event': (1, 3), 'revenue': (1, 2), 'sales': (1, 2)}
+
+_Constant = getattr(ast, 'Constant', None)  # Python 3.6+ constants node
+
+# Parser of Python 2 and 3.6 / 3.7 emits Num and Str nodes, ast.Constant
+# is used since 3.8 (and Num / Str are removed in 3.14)
+if sys.version_info < (3, 8):
+    _legacy = ((ast.Num, 'n'), (ast.Str, 's'))
+else:
+    _legacy = ()
+
+def _const(node):
+    ''' Return value of constant node or raise ValueError '''
+
+    if _Constant is not None and isinstance(node, _Constant):
+        return node.value
+    for cls, attr in _legacy:
+        if isinstance(node, cls):
+            return getattr(node, attr)
+    raise ValueError('Constant is expected')
+
+def _call_key(node):
+    ''' Return base series key of event, revenue or sales call '''
+
+    hi = _calls[node.func.id][1]
+    args = tuple(str(_const(i)) for i in node.args)
+    return (node.func.id,) + args + (None,) * (hi - len(args))
+
+class Expression(object):
+    '''
+    Parsed expression, only arithmetic operators, numbers, names and
+    series calls are allowed
+    '''
+
+    def __init__(self, text, variables=(), factors=None):
+
+        # variables - names of constants set on evaluation (tax, ...)
+        # factors - allowed KPI factors, any name is allowed if not set
+        self.text = text
+        self.variables = frozenset(variables)
+        self.factors = frozenset(factors) if factors else None
+        self.deps = []  # base series keys in order of appearance
+
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError('Bad expression %r: %s' % (text, e))
+        self.tree = self.__check(tree.body)
+
+    def __repr__(self):
+        return 'Expression(%r)' % self.text
+
+    def __check(self, node):
+        ''' Validate node, collect base series. Return node '''
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _binary:
+            self.__check(node.left)
+            self.__check(node.right)
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in _unary:
+            self.__check(node.operand)
+        elif isinstance(node, ast.Name):
+            if node.id not in self.variables:
+                if self.factors is not None and node.id not in self.factors:
+                    raise ValueError('Unknown KPI factor %s in %r' %
+                                     (node.id, self.text))
+                self.__add(('kpi', node.id))
+        elif isinstance(node, ast.Call):
+            name = getattr(node.func, 'id', None)
+            if name not in _calls or node.keywords:
+                raise ValueError('Unknown function in %r, use %s' %
+                                 (self.text, ', '.join(sorted(_calls))))
+            lo, hi = _calls[name]
+            if not lo <= len(node.args) <= hi:
+                raise ValueError('%s() takes %s to %s arguments' %
+                                 (name, lo, hi))
+            try:
+                self.__add(_call_key(node))
+            except ValueError:
+                raise ValueError('Arguments of %s() must be constants' % name)
+        else:
+            try:
+                value = _const(node)
+            except ValueError:
+                raise ValueError('Not allowed syntax in %r' % self.text)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError('Only numbers are allowed in %r' % self.text)
+
+        return node
+
+    def __add(self, key):
+        if key not in self.deps:
+            self.deps.append(key)
+
+    def evaluate(self, series, variables=None):
+        '''
+        Evaluate expression over all days at once
+        # series - dict {base series key: numpy array or list with values}
+        # variables - dict {name: number}
+        Division by zero gives 0. Return numpy array, list or number
+        '''
+
+        return self.__eval(self.tree, series, variables or {})
+
+    def __eval(self, node, series, variables):
+
+        if isinstance(node, ast.BinOp):
+            return _apply(type(node.op),
+                          self.__eval(node.left, series, variables),
+                          self.__eval(node.right, series, variables))
+        elif isinstance(node, ast.UnaryOp):
+            value = self.__eval(node.operand, series, variables)
+            if isinstance(value, list):
+                return [_unary[type(node.op)](i) for i in value]
+            return _unary[type(node.op)](value)
+        elif isinstance(node, ast.Name):
+            if node.id in variables:
+                return variables[node.id]
+            return series[('kpi', node.id)]
+        elif isinstance(node, ast.Call):
+            return series[_call_key(node)]
+        return _const(node)
+
+def _apply(op, a, b):
+    ''' Apply binary operator to arrays, lists or numbers '''
+
+    func = _binary[op]
+    if np is not None and (isinstance(a, np.ndarray) or
+                           isinstance(b, np.ndarray)):
+        a = np.asarray(a, dtype=np.float64)
+        b = np.asarray(b, dtype=np.float64)
+        if op is ast.Div:
+            a, b = np.broadcast_arrays(a, b)
+            return np.divide(a, b, out=np.zeros(a.shape), where=b != 0)
+        return func(a, b)
+
+    a_lst = isinstance(a, list)
+    b_lst = isinstance(b, list)
+    if not (a_lst or b_lst):
+        return _scalar(func, op, a, b)
+    if not a_lst:
+        a = [a] * len(b)
+    if not b_lst:
+        b = [b] * len(a)
+    return [_scalar(func, op, i, j) for i, j in zip(a, b)]
+
+def _scalar(func, op, a, b):
+    if op is ast.Div and not b:  # ZeroDivisionError fix
+        return 0
+    return func(a, b)
+
+def parse(exprs, variables=(), factors=None):
+    '''
+    Parse expressions
+    # exprs - dict {metric name: expression text} or list with texts,
+    # texts are metrics names then
+    Return list with (name, Expression) tuples
+    '''
+
+    if isinstance(exprs, dict):
+        items = list(exprs.items())
+    else:
+        items = [(i, i) for i in exprs]
+
+    return [(name, Expression(text, variables, factors))
+            for name, text in items]
+
+def dependencies(parsed):
+    ''' Return list with distinct base series keys of all expressions '''
+
+    res = []
+    seen = set()
+    for name, e in parsed:
+        for key in e.deps:
+            if key not in seen:
+                seen.add(key)
+                res.append(key)
+    return res
+
+def _request_key(key):
+    '''
+    Return key of request which gets base series, one payload request
+    returns all values of payload key
+    '''
+
+    if key[0] == 'event' and key[2]:
+        return key[:3]
+    return key
+
+def request_keys(keys):
+    '''
+    Return list with distinct requests needed for base series keys:
+    ('kpi', factor), ('event', name, payload key or None, [None]),
+    ('revenue' or 'sales', item, currency)
+    '''
+
+    res = []
+    for key in keys:
+        if _request_key(key) not in res:
+            res.append(_request_key(key))
+    return res
+
+def request(session, key, params):
+    '''
+    Request data for request key (see request_keys) with session method
+    Return method result, coroutine for async session
+    '''
+
+    kind = key[0]
+    if kind == 'kpi':
+        return session.get_kpi(key[1], params=dict(params))
+    elif kind == 'event':
+        return session.get_evt_stat(key[1], key[2], params=dict(params))
+    else:  # revenue or sales
+        return session.get_item_sales(key[1], currency=key[2],
+                                      revenue=kind == 'revenue',
+                                      params=dict(params))
+
+def series_data(keys, responses):
+    '''
+    Build base series from responses
+    # responses - dict {request key: result of request}
+    Return date labels and dict {key: values array or list}
+    '''
+
+    # KPI factor is a list, other responses are dicts with few series
+    responses = dict((k, {k[1]: v} if k[0] == 'kpi' else v)
+                     for k, v in responses.items())
+
+    labels = []
+    for data in responses.values():
+        for lst in (data or {}).values():
+            labels = [i[0] for i in lst]
+            break
+        if labels:
+            break
+
+    series = {}
+    for key in keys:
+        data = responses[_request_key(key)] or {}
+        if key[0] == 'event' and key[3] is not None:  # one payload value
+            data = dict((k, v) for k, v in data.items() if k == key[3])
+
+        # Few series (payload values, currencies) are summed up
+        values = [0.0] * len(labels)
+        for lst in data.values():
+            values = [v + (i[1] or 0) for v, i in zip(values, lst)]
+        series[key] = np.asarray(values, dtype=np.float64) \
+            if np is not None else values
+
+    return labels, series
+
+def fetch_series(session, keys, params=None, workers=8):
+    '''
+    Request base series concurrently, every request is sent once
+    Return date labels and dict {key: values array or list}
+    '''
+
+    params = params or dict(session.defaults)
+    req_keys = request_keys(keys)
+    res = session._map(lambda key: request(session, key, params), req_keys,
+                       workers)
+
+    return series_data(keys, dict(zip(req_keys, res)))
+
+def compute(parsed, labels, series, variables=None, with_date=True,
+            ndigits=4, as_array=False):
+    '''
+    Evaluate parsed expressions over base series
+    Return list like get_few_kpi returns or series.TimeSeries
+    '''
+
+    names = [name for name, e in parsed]
+    columns = []
+    for name, e in parsed:
+        value = e.evaluate(series, variables)
+        if np is not None:
+            value = np.broadcast_to(np.asarray(value, dtype=np.float64),
+                                    (len(labels),))
+            if ndigits is not None:
+                value = np.round(value, ndigits)
+        else:
+            if not isinstance(value, list):
+                value = [value] * len(labels)
+            value = [float(i) for i in value]
+            if ndigits is not None:
+                value = [round(i, ndigits) for i in value]
+        columns.append(value)
+
+    if as_array:
+        values = np.column_stack(columns) if columns else \
+            np.empty((len(labels), 0))
+        return TimeSeries(TimeSeries.parse_dates(labels), values, names)
+
+    if np is not None:
+        columns = [i.tolist() for i in columns]
+    rows = [list(i) for i in zip(*columns)] if columns else \
+        [[] for i in labels]
+    if with_date:
+        return [[d] + row for d, row in zip(labels, rows)]
+    return rows
+
+def evaluate(session, exprs, with_date=True, params=None, variables=None,
+             workers=8, ndigits=4, as_array=False):
+    '''
+    Evaluate derived KPI expressions for session
+    # exprs - dict {metric name: expression text} or list with texts
+    # variables - dict with constants like {'tax': 0.3}
+    # ndigits - round results, not rounded if None
+    Return list like get_few_kpi returns, columns are expressions
+    # as_array - return series.TimeSeries where series names are metrics
+    '''
+
+    variables = variables or {}
+    parsed = parse(exprs, variables, getattr(session, 'kpi_factors', None))
+    labels, series = fetch_series(session, dependencies(parsed), params,
+                                  workers)
+
+    return compute(parsed, labels, series, variables, with_date, ndigits,
+                   as_array)
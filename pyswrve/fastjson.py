@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import codecs, json, re
+
+# Fastest installed json decoder: orjson, ujson or standard json module
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+try:
+    import ujson
+except ImportError:  # ujson is optional
+    ujson = None
+
+if orjson is not None:
+    backend = 'orjson'
+elif ujson is not None:
+    backend = 'ujson'
+else:
+    backend = 'json'
+
+# Whitespace and separators between items of array
+_skip = re.compile(r'[\s,]*')
+_decoder = json.JSONDecoder()
+
+def set_backend(name):
+    ''' Select decoder: 'orjson', 'ujson' or 'json' '''
+
+    global backend
+
+    if name not in ('orjson', 'ujson', 'json'):
+        raise ValueError('Unknown json backend %s' % name)
+    if name != 'json' and globals()[name] is None:
+        raise ImportError('%s is not installed' % name)
+    backend = name
+
+def loads(data):
+    '''
+    Decode json from bytes or string with selected backend
+    Raise ValueError if data isn't json
+    '''
+
+    if backend == 'orjson':
+        return orjson.loads(data)  # orjson.JSONDecodeError is ValueError
+
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    if backend == 'ujson':
+        return ujson.loads(data)
+    return json.loads(data)
+
+def iter_array(chunks, min_read=65536):
+    '''
+    Decode json array from iterable with bytes chunks (streamed response)
+    and yield its items one by one, only current items are kept in memory
+    If document isn't an array it's decoded at once and yielded as one item
+    # min_read - min size of text which is decoded at once
+    '''
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = False
+
+    def read(buf, pos, size):
+        ''' Add size chars (or more) of text to buffer, drop decoded part '''
+
+        buf = buf[pos:]
+        parts = [buf]
+        length = len(buf)
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            parts.append(text)
+            length += len(text)
+            if length >= size:
+                return ''.join(parts), False
+        parts.append(decoder.decode(b'', True))
+        return ''.join(parts), True
+
+    # Document type is known by first char
+    while not buf.strip() and not eof:
+        buf, eof = read(buf, 0, 1)
+    buf = buf.lstrip()
+    if not buf.startswith('['):  # error message or other object
+        while not eof:
+            buf, eof = read(buf, 0, len(buf) * 2 + min_read)
+        yield loads(buf)
+        return
+
+    pos = 1
+    size = min_read
+    while True:
+        pos = _skip.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == ']':
+            return
+
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            # Item isn't complete, read more. Big items double read size
+            buf, eof = read(buf, pos, len(buf) - pos + size)
+            pos = 0
+            size *= 2
+            continue
+
+        # Number at the end of buffer can be incomplete
+        if end == len(buf) and not eof:
+            buf, eof = read(buf, pos, len(buf) - pos + size)
+            pos = 0
+            continue
+
+        size = min_read
+        pos = end
+        yield item
+
+        if pos >= len(buf) and not eof:
+            buf, eof = read(buf, pos, size)
+            pos = 0
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+import bisect, json, sys, threading, time
+
+if sys.version_info[0] < 3:  # Python 2
+    from urlparse import urlsplit
+else:  # Python 3
+    from urllib.parse import urlsplit
+
+def endpoint(url):
+    '''
+    Return short endpoint name for metrics
+    'https://dashboard.swrve.com/api/1/exporter/kpi/dau.json' => 'kpi/dau.json'
+    Files urls are unique, host is used as name for them
+    '''
+
+    parts = urlsplit(url)
+    if '/exporter/' in parts.path:
+        return parts.path.split('/exporter/', 1)[1]
+    return parts.netloc
+
+class Hooks(object):
+    '''
+    Instrumentation hooks called by transport, sessions, downloader and
+    caches. Methods do nothing, subclass it and override needed methods
+    '''
+
+    def request_start(self, endpoint, url, params):
+        '''
+        Called before request (first attempt)
+        Return value is passed to request_end as start
+        '''
+
+        return time.time()
+
+    def request_end(self, endpoint, start, status=None, nbytes=0, error=None):
+        '''
+        Called after last attempt of request
+        # status - HTTP status, None if request failed without response
+        # nbytes - response body size, 0 for streamed responses
+        # error - exception if request failed without response
+        '''
+
+    def retry(self, endpoint, reason):
+        ''' Called before retry, reason is HTTP status or error class name '''
+
+    def transferred(self, endpoint, nbytes):
+        ''' Called when streamed response (file) was read '''
+
+    def error(self, endpoint, error):
+        ''' Called on errors which aren't request errors (api, download) '''
+
+    def cache(self, name, hits=0, misses=0):
+        ''' Called on cache lookups '''
+
+class MetricsCollector(Hooks):
+    '''
+    Thread-safe in-memory metrics: requests, statuses, latency histograms,
+    bytes, retries and errors per endpoint, hits and misses per cache
+    '''
+
+    # Latency histogram buckets upper bounds, seconds
+    buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets=None):
+
+        if buckets:
+            self.buckets = tuple(sorted(buckets))
+
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        ''' Remove all collected values '''
+
+        with self.__lock:
+            self.endpoints = {}
+            self.caches = {}
+
+    def __endpoint(self, name):
+        ''' Return endpoint counters, must be called with lock '''
+
+        d = self.endpoints.get(name)
+        if d is None:
+            d = {'requests': 0, 'errors': 0, 'retries': 0, 'bytes': 0,
+                 'statuses': {}, 'error_types': {},
+                 'latency_sum': 0.0, 'latency_max': 0.0,
+                 'latency_buckets': [0] * (len(self.buckets) + 1)}
+            self.endpoints[name] = d
+        return d
+
+    def request_end(self, endpoint, start, status=None, nbytes=0, error=None):
+
+        latency = time.time() - start
+        # Index of first bucket which bound >= latency, last bucket is +Inf
+        idx = bisect.bisect_left(self.buckets, latency)
+
+        with self.__lock:
+            d = self.__endpoint(endpoint)
+            d['requests'] += 1
+            d['bytes'] += nbytes
+            d['latency_sum'] += latency
+            d['latency_max'] = max(d['latency_max'], latency)
+            d['latency_buckets'][idx] += 1
+            if status is not None:
+                d['statuses'][status] = d['statuses'].get(status, 0) + 1
+            if error is not None or (status or 0) >= 400:
+                d['errors'] += 1
+            if error is not None:
+                name = type(error).__name__
+                d['error_types'][name] = d['error_types'].get(name, 0) + 1
+
+    def retry(self, endpoint, reason):
+
+        with self.__lock:
+            self.__endpoint(endpoint)['retries'] += 1
+
+    def transferred(self, endpoint, nbytes):
+
+        with self.__lock:
+            self.__endpoint(endpoint)['bytes'] += nbytes
+
+    def error(self, endpoint, error):
+
+        name = type(error).__name__
+        with self.__lock:
+            d = self.__endpoint(endpoint)
+            d['errors'] += 1
+            d['error_types'][name] = d['error_types'].get(name, 0) + 1
+
+    def cache(self, name, hits=0, misses=0):
+
+        with self.__lock:
+            d = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+            d['hits'] += hits
+            d['misses'] += misses
+
+    def snapshot(self):
+        ''' Return copy of all metrics as dict '''
+
+        with self.__lock:
+            endpoints = {}
+            for name, d in self.endpoints.items():
+                d = dict(d, statuses=dict(d['statuses']),
+                         error_types=dict(d['error_types']),
+                         latency_buckets=list(d['latency_buckets']))
+                d['latency_avg'] = d['latency_sum'] / (d['requests'] or 1)
+                endpoints[name] = d
+            caches = dict((k, dict(v)) for k, v in self.caches.items())
+
+        return {'buckets': list(self.buckets), 'endpoints': endpoints,
+                'caches': caches}
+
+    def to_json(self, **kwargs):
+        ''' Dump metrics to json string '''
+
+        return json.dumps(self.snapshot(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix='pyswrve'):
+        ''' Dump metrics in Prometheus text exposition format '''
+
+        snap = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+        endpoints = sorted(snap['endpoints'].items())
+
+        metric('requests_total', 'counter', 'Requests by endpoint and status')
+        for name, d in endpoints:
+            for status, count in sorted(d['statuses'].items()):
+                lines.append('%s_requests_total{endpoint="%s",status="%s"} %s'
+                             % (prefix, label(name), status, count))
+            failed = d['requests'] - sum(d['statuses'].values())
+            if failed:  # requests without response
+                lines.append('%s_requests_total{endpoint="%s",status="none"} \
+%s' % (prefix, label(name), failed))
+
+        for key, kind, help_text in (
+                ('errors', 'errors_total', 'Failed requests and errors'),
+                ('retries', 'retries_total', 'Retried attempts'),
+                ('bytes', 'bytes_total', 'Received bytes')):
+            metric(kind, 'counter', help_text)
+            for name, d in endpoints:
+                lines.append('%s_%s{endpoint="%s"} %s' %
+                             (prefix, kind, label(name), d[key]))
+
+        metric('request_seconds', 'histogram', 'Request latency')
+        for name, d in endpoints:
+            total = 0
+            bounds = [str(i) for i in snap['buckets']] + ['+Inf']
+            for bound, count in zip(bounds, d['latency_buckets']):
+                total += count
+                lines.append('%s_request_seconds_bucket{endpoint="%s",\
+le="%s"} %s' % (prefix, label(name), bound, total))
+            lines.append('%s_request_seconds_sum{endpoint="%s"} %s' %
+                         (prefix, label(name), d['latency_sum']))
+            lines.append('%s_request_seconds_count{endpoint="%s"} %s' %
+                         (prefix, label(name), d['requests']))
+
+        caches = sorted(snap['caches'].items())
+        for key in ('hits', 'misses'):
+            metric('cache_%s_total' % key, 'counter', 'Cache %s' % key)
+            for name, d in caches:
+                lines.append('%s_cache_%s_total{cache="%s"} %s' %
+                             (prefix, key, label(name), d[key]))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import re, threading
+
+class QueryFilter(object):
+    '''
+    Compiled filter for lists of events, payloads, segments, etc...
+    # q - query (or list with them) when item saves if match with query
+    # nq - query (or list with them) when item saves if NOT match with query
+    Queries are case insensitive regular expressions, all queries of q (nq)
+    are joined to one pattern. Plain strings are checked as substrings.
+    '''
+
+    # Regular expressions special symbols
+    special = frozenset('.^$*+?{}[]\\|()')
+
+    # Compiled filters by (q, nq)
+    __cache = {}
+    __lock = threading.Lock()
+
+    def __init__(self, q=None, nq=None):
+
+        self.q = self.__compile(q)
+        self.nq = self.__compile(nq)
+
+    @classmethod
+    def get(cls, q=None, nq=None):
+        ''' Return compiled filter for queries, filters are reused '''
+
+        key = (tuple(q or ()), tuple(nq or ()))
+        with cls.__lock:
+            if key not in cls.__cache:
+                cls.__cache[key] = cls(q, nq)
+            return cls.__cache[key]
+
+    def __compile(self, queries):
+        ''' Return match function for list of queries or None '''
+
+        if not queries:
+            return
+
+        # Plain strings, substring check is faster than regular expression
+        if not any(self.special.intersection(i) for i in queries):
+            lits = tuple(set(i.lower() for i in queries))
+
+            def match(item):
+                item = item.lower()
+                for i in lits:
+                    if i in item:
+                        return True
+                return False
+
+            return match
+
+        pattern = re.compile('|'.join('(?:%s)' % i for i in queries),
+                             re.IGNORECASE)
+        return pattern.search
+
+    def match(self, item):
+        ''' Check does item pass the filter '''
+
+        if self.q and not self.q(item):
+            return False
+        if self.nq and self.nq(item):
+            return False
+        return True
+
+    def filter(self, data):
+        '''
+        Return list with items which pass the filter,
+        order is kept and duplicates are removed
+        '''
+
+        res = []
+        seen = set()
+        for item in data:
+            if item not in seen and self.match(item):
+                seen.add(item)
+                res.append(item)
+
+        return res
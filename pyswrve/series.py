@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, needed only for array results
+    np = None
+
+class TimeSeries(object):
+    '''
+    Time series backed by numpy arrays
+    Dates are datetime64[D] array, values are float64 array with one
+    column per series (names are column titles)
+    '''
+
+    def __init__(self, dates, values, names=None):
+
+        if np is None:
+            raise ImportError('numpy is required for array results')
+
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.values.ndim == 1:
+            self.values = self.values.reshape(-1, 1)
+        self.names = list(names) if names else [None] * self.values.shape[1]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        return 'TimeSeries(%s days, %s)' % (len(self), self.names)
+
+    def __getitem__(self, name):
+        ''' Return values of series by name '''
+
+        return self.values[:, self.names.index(name)]
+
+    @staticmethod
+    def parse_dates(labels):
+        ''' Convert swrve labels like 'D-2015-01-31' to datetime64 array '''
+
+        return np.array([i[-10:] for i in labels], dtype='datetime64[D]')
+
+    @classmethod
+    def from_data(cls, data, name=None):
+        ''' Create from swrve data like [['D-2015-01-31', 126.0], ...] '''
+
+        if np is None:
+            raise ImportError('numpy is required for array results')
+
+        return cls(cls.parse_dates([i[0] for i in data]),
+                   [i[1] or 0 for i in data], [name])
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Create from dict {name: [['D-2015-01-31', 126.0], ...]}
+        All series must have the same dates
+        '''
+
+        if np is None:
+            raise ImportError('numpy is required for array results')
+
+        names = list(data.keys())
+        if not names:
+            return cls([], np.empty((0, 0)))
+
+        first = data[names[0]]
+        values = np.empty((len(first), len(names)), dtype=np.float64)
+        for col, name in enumerate(names):
+            values[:, col] = [i[1] or 0 for i in data[name]]
+
+        return cls(cls.parse_dates([i[0] for i in first]), values, names)
+
+    @classmethod
+    def join(cls, series_lst, names=None):
+        ''' Join series with the same dates to one multi series object '''
+
+        values = np.hstack([i.values for i in series_lst])
+        if names is None:
+            names = sum([i.names for i in series_lst], [])
+        return cls(series_lst[0].dates, values, names)
+
+    def copy(self, values=None):
+        ''' Return series with the same dates and names and new values '''
+
+        if values is None:
+            values = self.values.copy()
+        return TimeSeries(self.dates, values, self.names)
+
+    def apply_tax(self, tax):
+        ''' Return values * (1 - tax) '''
+
+        return self.copy(self.values * (1 - tax))
+
+    def per_user(self, dau):
+        ''' Return values / DAU, days with zero DAU are 0 '''
+
+        dau = np.asarray(dau, dtype=np.float64).reshape(-1, 1)
+        res = np.zeros_like(self.values)
+        np.divide(self.values, dau, out=res, where=dau != 0)
+        return self.copy(res)
+
+    def round(self, ndigits):
+        ''' Return rounded values '''
+
+        return self.copy(np.round(self.values, ndigits))
+
+    def sum(self):
+        ''' Return dict {name: sum of values} '''
+
+        return dict(zip(self.names, self.values.sum(axis=0).tolist()))
+
+    def to_list(self, with_date=True):
+        '''
+        Convert to lists like swrve data, [['D-2015-01-31', 126.0, ...], ...]
+        or [126.0, ...] for one series without dates
+        '''
+
+        values = self.values.tolist()
+        if with_date:
+            labels = ['D-%s' % i for i in self.dates.astype(str)]
+            return [[d] + v for d, v in zip(labels, values)]
+        elif self.values.shape[1] == 1:
+            return [v[0] for v in values]
+        else:
+            return values
+
+    def to_dict(self, with_date=True):
+        ''' Convert to dict {name: swrve data} like get_evt_stat returns '''
+
+        labels = ['D-%s' % i for i in self.dates.astype(str)]
+        res = {}
+        for col, name in enumerate(self.names):
+            values = self.values[:, col].tolist()
+            if with_date:
+                res[name] = [[d, v] for d, v in zip(labels, values)]
+            else:
+                res[name] = values
+
+        return res
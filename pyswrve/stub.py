@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+'''
+Local stub of Swrve Export API with synthetic data for offline benchmarks
+and experiments. Usage:
+
+    with StubServer(latency=0.05, error_rate=0.01) as stub:
+        s = pyswrve.API('key', 'key', base_url=stub.url)
+
+or from shell: python -m pyswrve.stub --port 8080 --latency 0.05
+'''
+
+import argparse, gzip, hashlib, io, json, random, re, sys, threading, time, zlib
+from datetime import date, datetime, timedelta
+
+if sys.version_info[0] < 3:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+else:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs
+
+def _number(*keys):
+    ''' Deterministic number in [0, 1) for keys, the same for every call '''
+
+    s = '|'.join(str(i) for i in keys).encode('utf-8')
+    return (zlib.crc32(s) & 0xffffffff) / 4294967296.0
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep-alive support
+    disable_nagle_algorithm = True
+
+    routes = (
+        (re.compile(r'/api/1/exporter/kpi/(?P<name>[^/]+)\.json$'), 'kpi'),
+        (re.compile(r'/api/1/exporter/event/list$'), 'event_list'),
+        (re.compile(r'/api/1/exporter/event/payloads$'), 'payload_list'),
+        (re.compile(r'/api/1/exporter/event/count$'), 'event_count'),
+        (re.compile(r'/api/1/exporter/event/payload$'), 'event_payload'),
+        (re.compile(r'/api/1/exporter/segment/list$'), 'segment_list'),
+        (re.compile(r'/api/1/exporter/item/(?P<name>sales|revenue)$'),
+         'item_sales'),
+        (re.compile(r'/api/1/userdbs\.json$'), 'userdbs'),
+        (re.compile(r'/files/(?P<name>[^/]+)$'), 'file'),
+    )
+
+    def do_GET(self):
+
+        stub = self.server.stub
+        parts = urlsplit(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(parts.query).items())
+
+        delay = stub.latency + random.uniform(0, stub.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if stub.error_rate and random.random() < stub.error_rate:
+            status = random.choice(stub.error_statuses)
+            return self.send_body(status, b'<html>stub error</html>',
+                                  'text/html', {'Retry-After': '0'})
+
+        for regex, name in self.routes:
+            m = regex.match(parts.path)
+            if m:
+                break
+        else:
+            return self.send_json(404, {'error': 'Unknown endpoint'})
+
+        if name == 'file':
+            return self.send_file(m.group('name'))
+        if not (params.get('api_key') and params.get('personal_key')):
+            return self.send_json(200, {'error': 'Missing api_key or \
+personal_key'})
+
+        body = getattr(stub, name)(params, *m.groups())
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        self.send_body(status, json.dumps(body).encode('utf-8'),
+                       'application/json')
+
+    def send_body(self, status, body, content_type, headers=None):
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, name):
+        '''
+        Send userdb file, Range header is supported for resume, whole file
+        is sent if If-Range doesn't match ETag
+        '''
+
+        body = self.server.stub.file(name)
+        total = len(body)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        m = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if not m or self.headers.get('If-Range', etag) != etag:
+            return self.send_body(200, body, 'application/octet-stream',
+                                  {'ETag': etag})
+
+        offset = int(m.group(1))
+        if offset >= total:
+            return self.send_body(416, b'', 'application/octet-stream',
+                                  {'Content-Range': 'bytes */%s' % total})
+        self.send_body(206, body[offset:], 'application/octet-stream',
+                       {'Content-Range': 'bytes %s-%s/%s' %
+                        (offset, total - 1, total), 'ETag': etag})
+
+    def log_message(self, *args):
+        pass
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+class StubServer(object):
+    '''
+    Threaded HTTP server with synthetic responses for all endpoints used by
+    SwrveSession and Downloader. Values are deterministic, the same request
+    always gets the same data
+    '''
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0,
+                 error_rate=0, error_statuses=(429, 503), items=50,
+                 payload_values=10, inactive_rate=0.2, files=4,
+                 file_size=1048576):
+
+        # latency - seconds added to every response, jitter - max random
+        # seconds added to latency
+        # error_rate - part of responses (0..1) which are error_statuses
+        # items - count of events, segments, payload keys and items in lists
+        # payload_values - count of values of every payload key
+        # inactive_rate - part of events and segments without data (0..1)
+        # files - count of userdb files, file_size - approximate size of
+        # every gzip file in bytes
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.items = items
+        self.payload_values = payload_values
+        self.inactive_rate = inactive_rate
+        self.files = files
+        self.file_size = file_size
+
+        self.__files = {}
+        self.__lock = threading.Lock()
+
+        self.server = _Server((host, port), StubHandler)
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def url(self):
+        ''' Base url for sessions and downloaders '''
+
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%s' % (host, port)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        ''' Serve in background thread. Return self '''
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        ''' Stop server and close its socket '''
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    ### --- Synthetic data --- ###
+    def dates(self, params):
+        ''' Return date labels for start / stop or history params '''
+
+        try:
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date()
+            stop = datetime.strptime(params['stop'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):  # history or nothing, last 30 days
+            stop = date.today() - timedelta(days=1)
+            start = stop - timedelta(days=29)
+
+        return ['D-%s' % (start + timedelta(days=i))
+                for i in range((stop - start).days + 1)]
+
+    def active(self, name):
+        ''' Check does event or segment have data '''
+
+        return name is None or _number('active', name) >= self.inactive_rate
+
+    def series(self, params, *keys):
+        ''' Return [[label, value], ...] for series identified by keys '''
+
+        segment = params.get('segment')
+        if not (self.active(segment) and
+                (keys[0] != 'event' or self.active(keys[1]))):
+            return [[d, 0] for d in self.dates(params)]
+
+        keys += (segment,)
+
+        scale = 10 ** int(1 + _number('scale', *keys) * 4)
+        return [[d, round(scale * _number(d, *keys), 2)]
+                for d in self.dates(params)]
+
+    def kpi(self, params, name):
+        return [{'name': name, 'data': self.series(params, 'kpi', name,
+                                                   params.get('currency'))}]
+
+    def event_list(self, params):
+        return ['event.%s' % i for i in range(self.items)]
+
+    def payload_list(self, params):
+        return ['key%s' % i for i in range(self.items)]
+
+    def segment_list(self, params):
+        return ['Segment %s' % i for i in range(self.items)]
+
+    def event_count(self, params):
+        name = params.get('name', '')
+        return [{'name': name, 'data': self.series(params, 'event', name)}]
+
+    def event_payload(self, params):
+        name = params.get('name', '')
+        key = params.get('payload_key', '')
+        return [{'name': name, 'payload_key': key, 'payload_value': str(i),
+                 'data': self.series(params, 'event', name, key, i)}
+                for i in range(self.payload_values)]
+
+    def item_sales(self, params, kind):
+        names = [params['uid']] if params.get('uid') else \
+            ['item%s' % i for i in range(self.items)]
+        currencies = [params['currency']] if params.get('currency') else \
+            ['gold', 'coins']
+        return [{'name': name, 'currency': c,
+                 'data': self.series(params, kind, name, c)}
+                for name in names for c in currencies]
+
+    def userdbs(self, params):
+        urls = ['%s/files/users_%s.csv.gz' % (self.url, i)
+                for i in range(self.files)]
+        return {'date': str(date.today()),
+                'data_files': {'users': urls,
+                               'events': '%s/files/events.csv.gz' % self.url}}
+
+    def file(self, name):
+        ''' Return gzip csv file content, files are generated once '''
+
+        with self.__lock:
+            if name not in self.__files:
+                rnd = random.Random(name)
+                buf = io.BytesIO()
+                f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=1)
+                f.write(b'user_id,event,value,date\n')
+                while buf.tell() < self.file_size:
+                    rows = ''.join('%016x,event.%s,%s,2015-01-%02d\n' % (
+                        rnd.getrandbits(64), rnd.randint(0, self.items),
+                        rnd.randint(0, 1000), rnd.randint(1, 31))
+                        for i in range(1000))
+                    f.write(rows.encode('utf-8'))
+                f.close()
+                self.__files[name] = buf.getvalue()
+
+            return self.__files[name]
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Swrve Export API stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--payload-values', type=int, default=10)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--file-size', type=int, default=1048576)
+    args = parser.parse_args()
+
+    stub = StubServer(args.host, args.port, args.latency, args.jitter,
+                      args.error_rate, items=args.items,
+                      payload_values=args.payload_values, files=args.files,
+                      file_size=args.file_size)
+    print('Serving on %s' % stub.url)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+if __name__ == '__main__':
+    main()
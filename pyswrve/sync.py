@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+'''
+Incremental daily sync of series to local SQLite store. Every run requests
+only days after the last synced day (high-water mark) of every series plus
+refetch_days already synced days for late-arriving data. Usage:
+
+    store = SyncStore('swrve.sqlite')
+    Syncer(store).sync(session, ['dau', 'dollar_revenue',
+                                 'event("purchase")'])
+    store.rows('app', ['dau', 'dollar_revenue'])
+
+or from shell: python -m pyswrve.sync --db swrve.sqlite dau dollar_revenue
+
+Series are expressions of expr module (KPI factors, event, revenue and
+sales calls or derived KPI), all series with the same first day are
+requested together and every base series is requested once.
+'''
+
+import argparse, os.path, sqlite3, threading, time
+from datetime import date, timedelta
+
+from pyswrve.aggregate import parse_date
+from pyswrve.windows import to_date
+
+class SyncStore(object):
+    '''
+    SQLite store with daily values of synced series and high-water mark
+    (last synced day) of every (app, segment, series)
+    '''
+
+    def __init__(self, path=None):
+
+        # path - sqlite file path, $HOME/.pyswrve_sync.sqlite by default
+        self.path = path or os.path.join(os.path.expanduser('~'),
+                                         '.pyswrve_sync.sqlite')
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__conn:
+            self.__conn.execute('''CREATE TABLE IF NOT EXISTS days (
+app TEXT, segment TEXT, series TEXT, day TEXT, value REAL,
+PRIMARY KEY (app, segment, series, day))''')
+            self.__conn.execute('''CREATE TABLE IF NOT EXISTS marks (
+app TEXT, segment TEXT, series TEXT, day TEXT, synced REAL,
+PRIMARY KEY (app, segment, series))''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def mark(self, app, segment, series):
+        ''' Return last synced day (datetime.date) or None '''
+
+        with self.__lock:
+            row = self.__conn.execute('''SELECT day FROM marks
+WHERE app = ? AND segment = ? AND series = ?''',
+                                      (app, segment or '', series)).fetchone()
+        return to_date(row[0]) if row else None
+
+    def marks(self, app=None):
+        ''' Return list with (app, segment, series, day, synced) tuples '''
+
+        sql = 'SELECT app, segment, series, day, synced FROM marks'
+        args = ()
+        if app is not None:
+            sql += ' WHERE app = ?'
+            args = (app,)
+        with self.__lock:
+            return self.__conn.execute(sql + ' ORDER BY app, segment, series',
+                                       args).fetchall()
+
+    def save(self, app, segment, series, data):
+        '''
+        Save (replace) days and move high-water mark to the last day
+        # data - list with [day or swrve label, value] items
+        Return count of saved days
+        '''
+
+        rows = [(app, segment or '', series, str(parse_date(label)), value)
+                for label, value in data]
+        if not rows:
+            return 0
+        last = max(i[3] for i in rows)
+
+        with self.__lock:
+            with self.__conn:
+                self.__conn.executemany('''INSERT OR REPLACE INTO days
+VALUES (?, ?, ?, ?, ?)''', rows)
+                old = self.__conn.execute('''SELECT day FROM marks
+WHERE app = ? AND segment = ? AND series = ?''',
+                                          (app, segment or '',
+                                           series)).fetchone()
+                if old and old[0] > last:  # re-fetch of old days
+                    last = old[0]
+                self.__conn.execute('''INSERT OR REPLACE INTO marks
+VALUES (?, ?, ?, ?, ?)''', (app, segment or '', series, last, time.time()))
+
+        return len(rows)
+
+    def load(self, app, segment, series, start=None, stop=None):
+        ''' Return list with [day, value] items of synced series '''
+
+        sql = '''SELECT day, value FROM days
+WHERE app = ? AND segment = ? AND series = ?'''
+        args = [app, segment or '', series]
+        if start:
+            sql += ' AND day >= ?'
+            args.append(str(start))
+        if stop:
+            sql += ' AND day <= ?'
+            args.append(str(stop))
+
+        with self.__lock:
+            rows = self.__conn.execute(sql + ' ORDER BY day', args)
+            return [list(i) for i in rows]
+
+    def rows(self, app, series_lst, segment=None, start=None, stop=None):
+        '''
+        Return list like get_few_kpi returns: [day, value1, value2, ...],
+        missing days of series are None
+        '''
+
+        data = [dict(self.load(app, segment, s, start, stop))
+                for s in series_lst]
+        days = sorted(set(day for d in data for day in d))
+        return [[day] + [d.get(day) for d in data] for day in days]
+
+    def reset(self, app, segment=None, series=None):
+        '''
+        Remove synced days and marks of app, next sync is a full one
+        # segment, series - remove only this segment or series
+        '''
+
+        where = 'app = ?'
+        args = [app]
+        if segment is not None:
+            where += ' AND segment = ?'
+            args.append(segment)
+        if series is not None:
+            where += ' AND series = ?'
+            args.append(series)
+
+        with self.__lock:
+            with self.__conn:
+                self.__conn.execute('DELETE FROM days WHERE ' + where, args)
+                self.__conn.execute('DELETE FROM marks WHERE ' + where, args)
+
+    def close(self):
+        self.__conn.close()
+
+class Syncer(object):
+    ''' Append new days of series to SyncStore '''
+
+    def __init__(self, store, refetch_days=2, initial_days=30, workers=8):
+
+        # store - SyncStore object
+        # refetch_days - count of already synced days requested again,
+        # swrve updates last days when late data arrives
+        # initial_days - count of days requested for series without mark
+        # workers - max count of simultaneous requests
+        self.store = store
+        self.refetch_days = refetch_days
+        self.initial_days = initial_days
+        self.workers = workers
+
+    def plan(self, session, series_lst, app=None, segment=None, stop=None,
+             initial_start=None):
+        '''
+        Return dict {first day: list with series} of days which must be
+        requested, series which are up to date aren't included
+        # app - app name in store, session section by default
+        # segment - swrve segment, session default segment if not set
+        # stop - last day, yesterday by default
+        # initial_start - first day for series without mark
+        '''
+
+        app = app or session.section
+        segment = segment if segment is not None else \
+            session.defaults.get('segment')
+        stop = to_date(stop) if stop else date.today() - timedelta(days=1)
+
+        res = {}
+        for series in series_lst:
+            mark = self.store.mark(app, segment, series)
+            if mark is None:
+                start = to_date(initial_start) if initial_start else \
+                    stop - timedelta(days=self.initial_days - 1)
+            else:
+                start = mark + timedelta(days=1 - self.refetch_days)
+            if start <= stop:
+                res.setdefault(start, []).append(series)
+
+        return res
+
+    def sync(self, session, series_lst, app=None, segment=None, stop=None,
+             initial_start=None, variables=None):
+        '''
+        Request new days of series and append them to store
+        # series_lst - list with expressions like 'dau' or 'event("name")'
+        # variables - dict with constants of expressions like {'tax': 0.3}
+        Return dict {series: count of saved days}
+        '''
+
+        app = app or session.section
+        segment = segment if segment is not None else \
+            session.defaults.get('segment')
+        stop = to_date(stop) if stop else date.today() - timedelta(days=1)
+
+        res = dict((series, 0) for series in series_lst)
+        plan = self.plan(session, series_lst, app, segment, stop,
+                         initial_start)
+        for start, lst in sorted(plan.items()):
+            params = dict(session.defaults)
+            params.update(start=str(start), stop=str(stop), history=None,
+                          segment=segment)
+            data = session.get_derived(lst, params=params,
+                                       variables=variables,
+                                       workers=self.workers, ndigits=None)
+            for i, series in enumerate(lst):
+                res[series] = self.store.save(app, segment, series,
+                                              [[row[0], row[i+1]]
+                                               for row in data])
+
+        return res
+
+    def sync_apps(self, manager, series_lst, segment=None, stop=None,
+                  initial_start=None, variables=None, apps=None):
+        '''
+        Sync series of all apps of apps.AppManager concurrently
+        Return dict {app name: {series: count of saved days}}
+        '''
+
+        def sync_func(session):
+            return self.sync(session, series_lst, None, segment, stop,
+                             initial_start, variables)
+
+        return manager.run(sync_func, apps=apps)
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Append new days of swrve series to SQLite store')
+    parser.add_argument('series', nargs='+',
+                        help='KPI factors or expressions like event("name")')
+    parser.add_argument('--db', help='store path ($HOME/.pyswrve_sync.sqlite)')
+    parser.add_argument('--section', action='append',
+                        help='config file section (app), can be repeated')
+    parser.add_argument('--conf', help='config file ($HOME/.pyswrve)')
+    parser.add_argument('--segment')
+    parser.add_argument('--stop', help='last day, yesterday by default')
+    parser.add_argument('--initial-start',
+                        help='first day for series which are not synced yet')
+    parser.add_argument('--initial-days', type=int, default=30)
+    parser.add_argument('--refetch-days', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--base-url')
+    args = parser.parse_args()
+
+    from pyswrve.apps import AppManager  # api is imported only for command
+
+    store = SyncStore(args.db)
+    syncer = Syncer(store, args.refetch_days, args.initial_days, args.workers)
+    with AppManager(sections=args.section, conf_path=args.conf,
+                    workers=args.workers, base_url=args.base_url) as apps:
+        res = syncer.sync_apps(apps, args.series, args.segment, args.stop,
+                               args.initial_start)
+    store.close()
+
+    for app in sorted(res):
+        for series in args.series:
+            print('%s\t%s\t%s days' % (app, series, res[app][series]))
+
+if __name__ == '__main__':
+    main()
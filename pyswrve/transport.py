@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import random, threading, time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pyswrve.metrics import Hooks, endpoint
+
+class RateLimiter(object):
+    '''
+    Thread-safe token bucket shared by all requests which use it
+    Rate is lowered after throttled responses and slowly restored
+    '''
+
+    def __init__(self, rate=10, burst=None, min_rate=0.5):
+
+        # rate - requests per second, burst - max count of saved tokens
+        # min_rate - rate can't be lowered below this value
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.burst = float(burst or max(1, rate))
+
+        self.__tokens = self.burst
+        self.__last = time.time()
+        self.__lock = threading.Lock()
+
+    def reserve(self):
+        ''' Take one token, return seconds to wait before request '''
+
+        with self.__lock:
+            now = time.time()
+            self.__tokens = min(self.burst, self.__tokens +
+                                (now - self.__last) * self.rate)
+            self.__last = now
+            self.__tokens -= 1  # negative tokens are reserved by waiters
+
+            if self.__tokens >= 0:
+                return 0
+            return -self.__tokens / self.rate
+
+    def acquire(self):
+        ''' Wait for token '''
+
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    def throttled(self):
+        ''' Halve rate after throttled response '''
+
+        with self.__lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        ''' Restore rate step by step after successful responses '''
+
+        with self.__lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+class Transport(object):
+    '''
+    Pooled HTTP transport shared by all requests of a session
+    Connections are kept alive and reused between export calls
+    Throttled (429) and server error (5xx) responses are retried with
+    jittered exponential backoff
+    '''
+
+    # HTTP statuses which are retried
+    retry_statuses = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, pool_block=False,
+                 timeout=(10, 300), session=None, rate_limiter=None,
+                 max_retries=5, backoff=0.5, max_backoff=30, hooks=None):
+
+        # timeout - seconds or (connect, read) tuple, used for every request
+        # pool_connections - count of hosts which pools are cached
+        # pool_maxsize - max count of kept alive connections per host
+        # pool_block - wait for a free connection instead of opening a new one
+        # rate_limiter - RateLimiter object, can be shared by few transports
+        # max_retries - count of retries for throttled & failed requests
+        # backoff, max_backoff - retry delay is random value between
+        # 0 and min(max_backoff, backoff * 2 ^ retry) seconds
+        # hooks - metrics.Hooks object (MetricsCollector for example),
+        # it's called for every request, retry and cache lookup
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hooks = hooks if hooks is not None else Hooks()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections,
+                                  pool_maxsize=pool_maxsize,
+                                  pool_block=pool_block)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def retry_delay(self, retry, resp=None):
+        ''' Return seconds to wait before retry (counted from 0) '''
+
+        # Server can say how long to wait
+        after = resp.headers.get('Retry-After', '') if resp is not None else ''
+        if after.isdigit():
+            return min(float(after), self.max_backoff)
+
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * 2 ** retry))
+
+    def get(self, url, params=None, **kwargs):
+        '''
+        Do GET request using pooled connection. Return response.
+        Response of last attempt is returned if all retries were failed
+        '''
+
+        kwargs.setdefault('timeout', self.timeout)
+        hooks = self.hooks
+        name = endpoint(url)
+        start = hooks.request_start(name, url, params)
+
+        retry = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                resp = self.session.get(url, params=params, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if retry >= self.max_retries:
+                    hooks.request_end(name, start, error=e)
+                    raise
+                hooks.retry(name, type(e).__name__)
+                time.sleep(self.retry_delay(retry))
+                retry += 1
+                continue
+
+            status = resp.status_code
+            if status not in self.retry_statuses:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.succeeded()
+                break
+
+            if status == 429 and self.rate_limiter is not None:
+                self.rate_limiter.throttled()
+            if retry >= self.max_retries:
+                break
+
+            hooks.retry(name, status)
+            resp.close()
+            time.sleep(self.retry_delay(retry, resp))
+            retry += 1
+
+        # Streamed body isn't read yet, its size is reported by reader
+        nbytes = 0 if kwargs.get('stream') else len(resp.content)
+        hooks.request_end(name, start, status, nbytes)
+        return resp
+
+    def close(self):
+        ''' Close all pooled connections '''
+
+        self.session.close()
@@ -1,31 +1,70 @@
 # -*- coding: utf-8 -*-
 
-import requests, os.path, csv, sys
+import os.path, csv, sys, hashlib, codecs, errno, gzip, zlib
+from collections import OrderedDict
 from tempfile import NamedTemporaryFile
 from datetime import date, datetime, timedelta
-from time import sleep
+from time import sleep, time
 from socket import error as socket_error
+from threading import Lock, Thread
+
+from requests.exceptions import RequestException
+
+from pyswrve.aggregate import parse_date
+from pyswrve.errors import SwrveAPIError
+from pyswrve.export import write_csv
+from pyswrve.fastjson import loads
+from pyswrve.metrics import endpoint
+from pyswrve.transport import Transport
     
 if sys.version_info[0] < 3:  # Python 2
     from urlparse import urlsplit
+    from urllib import quote
     from ConfigParser import SafeConfigParser
-    from Queue import Queue
+    from Queue import Queue, Empty
 else:  # Python 3
-    from urllib.parse import urlsplit
+    from urllib.parse import urlsplit, quote
     from configparser import SafeConfigParser
-    from queue import Queue
+    from queue import Queue, Empty
+
+# Errors of local files which aren't fixed by retry
+_LOCAL_ERRORS = frozenset(getattr(errno, i) for i in (
+    'ENOENT', 'ENOTDIR', 'EISDIR', 'EACCES', 'EPERM', 'ENOSPC', 'EROFS',
+    'EDQUOT', 'ENAMETOOLONG') if hasattr(errno, i))
+
+# HTTP client errors which can be retried
+_RETRY_STATUSES = (408, 416, 429)
 
 ### --- User DB Downloads --- ###
 class Downloader(object):
     
-    # INI config file parser
-    __prs = SafeConfigParser()
-    defaults = {}
+    # Export API host, can be changed to proxy or local stub server
+    base_url = 'https://dashboard.swrve.com'
     
     def __init__(self, api_key=None, personal_key=None, section=None, 
-                 conf_path=None, max_attempts=10):
+                 conf_path=None, max_attempts=10, transport=None,
+                 timeout=None, pool_maxsize=None, backoff=1, max_backoff=60,
+                 chunk_size=1048576, hash_name=None, rate_limiter=None,
+                 hooks=None, base_url=None):
         
         section = section or 'defaults'
+        if base_url:
+            self.base_url = base_url.rstrip('/')
+        
+        # INI config file parser and request params with keys, own for
+        # every downloader so downloaders of different apps are isolated
+        self.__prs = SafeConfigParser()
+        self.defaults = {}
+        
+        # Pooled keep-alive connections shared by all downloads
+        # rate_limiter - transport.RateLimiter, can be shared with sessions
+        # hooks - metrics.Hooks object, gets requests, bytes and errors
+        if transport is None:
+            transport = Transport(pool_maxsize=pool_maxsize or 16,
+                                  timeout=timeout or (10, 300),
+                                  rate_limiter=rate_limiter, hooks=hooks)
+        self.transport = transport
+        self.hooks = transport.hooks
         
         # If not set on constructor load api and personal keys from config
         if not (api_key and personal_key):
@@ -38,6 +77,25 @@ class Downloader(object):
         self.q = Queue()
         
         self.max_attempts = max_attempts
+        
+        # Delay before retry is backoff * 2 ^ (attempt - 1) seconds
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        
+        # Size of chunks read from network and of file write buffer
+        self.chunk_size = chunk_size
+        
+        # Checksums algorithm, expected and calculated digests by urls
+        # hash_name - if set digests of all files are calculated, else
+        # only of files with expected checksum (md5 is used)
+        self.hash_name = hash_name or 'md5'
+        self.__hash_all = hash_name is not None
+        self.checksums = {}
+        self.digests = {}
+        
+        # Downloaded files and bytes counters, urls of failed files
+        self.stats = {'files': 0, 'bytes': 0, 'seconds': 0, 'failed': []}
+        self.__stats_lock = Lock()
     
     def read_conf(self, section, conf_path):
         ''' Read $HOME/.pyswrve config file '''
@@ -59,8 +117,11 @@ class Downloader(object):
     def get_urls(self, item, sec='data_files'):
         ''' Get urls list from swrve '''
         
-        req = requests.get('https://dashboard.swrve.com/api/1/userdbs.json', 
-                           params=self.defaults).json()
+        url = '%s/api/1/userdbs.json' % self.base_url
+        resp = self.transport.get(url, params=self.defaults)
+        req = loads(resp.content)
+        if type(req) == dict and 'error' in req.keys():
+            raise SwrveAPIError(req['error'], url, resp.status_code)
         
         if item == 'all':
             return req[sec]
@@ -70,52 +131,332 @@ class Downloader(object):
         else:
             return [req[sec][item]]
             
-    def download_file(self, url, path, mark_task=False, delay=None):
-        ''' Download file '''
+    def __expected_size(self, req):
+        ''' Return full file size reported by server or None '''
+        
+        if req.headers.get('Content-Encoding', 'identity') != 'identity':
+            return  # length of encoded data isn't file size
+        
+        if req.status_code == 206:  # Content-Range: bytes 100-999/1000
+            total = req.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+        else:
+            total = req.headers.get('Content-Length', '')
+        
+        if total.isdigit():
+            return int(total)
+    
+    @staticmethod
+    def __save_etag(req, etag_path):
+        ''' Save validator of file downloaded from zero for If-Range '''
+        
+        etag = req.headers.get('ETag') or req.headers.get('Last-Modified')
+        if etag:
+            with open(etag_path, 'w') as f:
+                f.write(etag)
+        else:
+            Downloader.__remove(etag_path)
+    
+    @staticmethod
+    def __remove(*paths):
+        ''' Remove files which exist '''
+        
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    @staticmethod
+    def __download_error(e):
+        '''
+        Return error without request url (it has api keys in query) and 
+        True if error is permanent: HTTP client error or local file error
+        '''
+        
+        if isinstance(e, RequestException):
+            resp = getattr(e, 'response', None)
+            if resp is None:
+                return type(e)(type(e).__name__), False
+            status = resp.status_code
+            return (type(e)('HTTP %s' % status), 
+                    400 <= status < 500 and status not in _RETRY_STATUSES)
+        
+        return e, getattr(e, 'errno', None) in _LOCAL_ERRORS
+    
+    def download_file(self, url, path, mark_task=False, delay=None, 
+                      checksum=None):
+        ''' 
+        Download file, partially downloaded file is resumed with Range header
+        # checksum - expected hex digest of file (self.hash_name algorithm),
+        # if not set self.checksums[url] is used when exists
+        File size is verified with size reported by server, digest is 
+        calculated while streaming and saved to self.digests[url] if 
+        checksum is set or hash_name was set on creation
+        ETag (or Last-Modified) of partially downloaded file is saved to 
+        .part.etag file and sent with If-Range, changed file is downloaded 
+        from zero. If all attempts failed url is added to stats['failed'], 
+        .part file is kept for next run. HTTP client errors (except 408, 
+        416, 429) and local file errors aren't retried
+        Return count of downloaded bytes
+        '''
         
         # Get file name from url and join it to path
         fpath = os.path.join(path, os.path.split(urlsplit(url)[2])[1])
+        part_path = fpath + '.part'
+        etag_path = part_path + '.etag'
+        checksum = checksum or self.checksums.get(url)
         
         # Request file and save it
+        loaded = 0
+        done = False
         attempts_counter = 1
         while attempts_counter <= self.max_attempts:
             # If connection reset by pear (for exeample) 
-            # restart file downloading
+            # continue file downloading since last saved byte
             try:
-                req = requests.get(url, params=self.defaults, stream=True)
-                with open(fpath, 'wb') as f:
-                    for i in req.iter_content(chunk_size=1024):
-                        if i:
-                            f.write(i)
-                            f.flush()
+                headers = {}
+                if os.path.exists(part_path):
+                    headers['Range'] = 'bytes=%s-' % os.path.getsize(part_path)
+                    if os.path.exists(etag_path):
+                        with open(etag_path) as f:
+                            headers['If-Range'] = f.read()
+                
+                req = self.transport.get(url, params=self.defaults,
+                                         stream=True, headers=headers)
+                digest = hashlib.new(self.hash_name) \
+                    if checksum or self.__hash_all else None
+                if req.status_code == 416:  # nothing left to download
+                    req.close()
+                    size = None
+                    mode = None
+                elif req.status_code == 206:  # resume
+                    size = self.__expected_size(req)
+                    mode = 'ab'
+                else:
+                    req.raise_for_status()
+                    size = self.__expected_size(req)
+                    mode = 'wb'  # server ignored Range, download from zero
+                    self.__save_etag(req, etag_path)
+                
+                # Digest of already downloaded part
+                if digest and mode != 'wb' and os.path.exists(part_path):
+                    with open(part_path, 'rb') as f:
+                        for i in iter(lambda: f.read(self.chunk_size), b''):
+                            digest.update(i)
+                
+                if mode:
+                    # Big buffered chunks, data is flushed by file buffer
+                    with open(part_path, mode, self.chunk_size) as f:
+                        for i in req.iter_content(chunk_size=self.chunk_size):
+                            if i:
+                                f.write(i)
+                                if digest:
+                                    digest.update(i)
+                                loaded += len(i)
+                
+                # Verify file, broken file is downloaded again from zero
+                part_size = os.path.getsize(part_path)
+                if size is not None and part_size != size:
+                    self.__remove(part_path, etag_path)
+                    raise IOError('size %s != %s' % (part_size, size))
+                if checksum and digest.hexdigest() != checksum.lower():
+                    self.__remove(part_path, etag_path)
+                    raise IOError('%s mismatch' % self.hash_name)
+                
+                os.rename(part_path, fpath)
+                self.__remove(etag_path)
+                if digest:
+                    self.digests[url] = digest.hexdigest()
                 print('%s download complete' % fpath)
+                done = True
                 break
-            except socket_error:
-                msg = '%s downloading error. Restarting. Attempt: %s / %s'
-                print(msg % (fpath, attempts_counter, self.max_attempts))
+            except (socket_error, IOError, RequestException) as e:
+                e, permanent = self.__download_error(e)
+                self.hooks.error(endpoint(url), e)
+                if permanent:
+                    print('%s downloading error (%s), not retried' % (fpath,
+                                                                      e))
+                    break
+                msg = '%s downloading error (%s). Resuming in %.1f s. \
+Attempt: %s / %s'
+                wait = min(self.backoff * 2 ** (attempts_counter - 1),
+                           self.max_backoff)
+                print(msg % (fpath, e, wait, attempts_counter,
+                             self.max_attempts))
                 attempts_counter += 1
+                if attempts_counter <= self.max_attempts:
+                    sleep(wait)
+        
+        self.hooks.transferred(endpoint(url), loaded)
+        with self.__stats_lock:
+            self.stats['bytes'] += loaded
+            if done:
+                self.stats['files'] += 1
+            else:
+                self.stats['failed'].append(url)
         
-        # Mark this task as done and start next queue's file download
+        # Mark this task as done
         if mark_task:
             if delay:
                 sleep(delay)
             self.q.task_done()
-            self.download_start(path)
         
-    def load_to_queue(self, lst):
-        ''' Paste urls from list to download queue '''
+        return loaded
         
+    def load_to_queue(self, lst, checksums=None):
+        ''' 
+        Paste urls from list to download queue
+        # checksums - dict {url: expected hex digest}
+        '''
+        
+        if checksums:
+            self.checksums.update(checksums)
         for item in lst:
             self.q.put(item)
+    
+    def __worker(self, path, delay):
+        ''' Download queue's files while queue isn't empty '''
+        
+        while True:
+            try:
+                url = self.q.get(block=False)
+            except Empty:
+                return
+            self.download_file(url, path, True, delay)
             
-    def download_start(self, path, delay=None):
-        ''' Start download of next queue's file '''
+    def download_start(self, path, delay=None, workers=1):
+        ''' 
+        Download all queue's files
+        # workers - count of files downloading at the same time
+        Return dict with files, bytes and seconds counters and list with 
+        urls of failed files
+        '''
         
-        if not self.q.empty():
-            self.download_file(self.q.get(block=True), path, True, delay)
-        else:
-            print('All downloads are complete')
+        self.stats = {'files': 0, 'bytes': 0, 'seconds': 0, 'failed': []}
+        start = time()
+        
+        threads = []
+        for i in range(workers):
+            t = Thread(target=self.__worker, args=(path, delay))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+        
+        self.stats['seconds'] = time() - start
+        mbytes = self.stats['bytes'] / 1048576.0
+        print('All downloads are complete: %s files, %.1f MB in %.1f s \
+(%.2f MB/s)' % (self.stats['files'], mbytes, self.stats['seconds'],
+                 mbytes / (self.stats['seconds'] or 1)))
+        if self.stats['failed']:
+            print('%s files are failed:\n%s' % (
+                len(self.stats['failed']), '\n'.join(self.stats['failed'])))
+        
+        return self.stats
 
+    def iter_lines(self, url, decompress=None):
+        '''
+        Stream file and yield its lines, gzip file is decompressed on the fly
+        # decompress - True / False, if not set gzip is detected by first bytes
+        Only current chunk is kept in memory, nothing is written to disk
+        '''
+        
+        req = self.transport.get(url, params=self.defaults, stream=True)
+        req.raise_for_status()
+        
+        dobj = None
+        decoder = None
+        nl = b'\n'
+        if sys.version_info[0] >= 3:  # csv module in Python 3 needs str
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            nl = '\n'
+        
+        tail = nl[:0]
+        first = True
+        loaded = 0
+        try:
+            for chunk in req.iter_content(chunk_size=self.chunk_size):
+                if not chunk:
+                    continue
+                loaded += len(chunk)
+                
+                if first:
+                    if decompress is None:  # gzip magic number
+                        decompress = chunk[:2] == b'\x1f\x8b'
+                    if decompress:
+                        dobj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    first = False
+                
+                if dobj:
+                    data = dobj.decompress(chunk)
+                    # Concatenated gzip members
+                    while dobj.eof and dobj.unused_data:
+                        rest = dobj.unused_data
+                        dobj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                        data += dobj.decompress(rest)
+                else:
+                    data = chunk
+                
+                if decoder:
+                    data = decoder.decode(data)
+                
+                # Yield complete lines, incomplete one waits for next chunk
+                data = tail + data
+                end = data.rfind(nl) + 1
+                tail = data[end:]
+                for line in data[:end].split(nl)[:-1]:
+                    yield line + nl
+            
+            if dobj:
+                data = dobj.flush()
+                if decoder:
+                    data = decoder.decode(data, True)
+                tail += data
+            for line in tail.split(nl):
+                if line:
+                    yield line + nl
+        finally:  # generator can be closed before end of file
+            req.close()
+            self.hooks.transferred(endpoint(url), loaded)
+    
+    def iter_rows(self, url, decompress=None, **fmtparams):
+        '''
+        Stream (gzip) csv file and yield parsed rows as lists
+        # fmtparams - csv.reader params like delimiter, quotechar, etc...
+        '''
+        
+        for row in csv.reader(self.iter_lines(url, decompress), **fmtparams):
+            yield row
+    
+    def ingest_file(self, url, path, column=None, header=True, 
+                    decompress=None, max_open=64, **fmtparams):
+        '''
+        Stream (gzip) csv file and write its rows to gzip csv partitions
+        # column - name (if header) or index of column for partitioning,
+        # rows are saved to path/column=value/part.csv.gz,
+        # if not set all rows are saved to path/part.csv.gz
+        # max_open - max count of simultaneously open partition files
+        Return dict {partition path: rows count}
+        '''
+        
+        by_name = not (isinstance(column, int) or column is None)
+        if by_name and not header:
+            raise ValueError('Column name %r needs header, set column \
+index for file without header' % column)
+        
+        rows = self.iter_rows(url, decompress, **fmtparams)
+        head = next(rows, None) if header else None
+        if not by_name:
+            index = column
+        elif head is None or column not in head:
+            rows.close()
+            raise ValueError('Column %r is not found in header' % column)
+        else:
+            index = head.index(column)
+        
+        return partition_rows(rows, path, index, head, 
+                              column if head and index is not None else index,
+                              max_open)
+    
 ### --- Functions --- ###
 def aggregate_weeks(data, day_average=False):
     ''' Aggregate days data by weeks '''
@@ -152,71 +493,79 @@ def aggregate_weeks(data, day_average=False):
     
     return week_data 
 
+def partition_rows(rows, path, index=None, head=None, name=None, 
+                   max_open=64):
+    '''
+    Write rows to gzip csv files partitioned by value of row[index]
+    Rows are saved to path/name=value/part.csv.gz, or to path/part.csv.gz 
+    if index not set. Rows are written one by one, data isn't kept in memory
+    Name and value are percent-encoded, so value like ../x stays in path
+    # max_open - max count of open files, least recently used file is 
+    # closed and opened again in append mode (new gzip member) when needed
+    Return dict {partition path: rows count}
+    '''
+    
+    files = OrderedDict()  # open files, least recently used first
+    counts = {}
+    try:
+        for row in rows:
+            if index is None:
+                part = path
+            else:
+                part = os.path.join(path, '%s=%s' % (
+                    quote(str(name), safe=' '), quote(row[index], safe=' ')))
+            
+            if part in files:
+                files[part] = files.pop(part)  # move to the end
+            else:
+                if len(files) >= max_open:
+                    files.popitem(last=False)[1][0].close()
+                
+                new = part not in counts
+                if new and not os.path.exists(part):
+                    os.makedirs(part)
+                fname = os.path.join(part, 'part.csv.gz')
+                mode = 'w' if new else 'a'
+                if sys.version_info[0] < 3:
+                    f = gzip.open(fname, mode + 'b')
+                else:
+                    f = gzip.open(fname, mode + 't', newline='')
+                files[part] = (f, csv.writer(f))
+                if new:
+                    counts[part] = 0
+                    if head:
+                        files[part][1].writerow(head)
+            
+            files[part][1].writerow(row)
+            counts[part] += 1
+    finally:
+        for f, w in files.values():
+            f.close()
+    
+    return counts
+
 def str2date(str_date, to_datetime=False):
     ''' Convert string to datetime.date or datetime.datetime '''
     
-    str_date = str_date.split('-')
-    for i in range(3):
-        str_date[i] = int(str_date[i])
+    d = parse_date(str_date)  # parsed dates are cached
     
     if to_datetime:
-        dobj = datetime
-    else:
-        dobj = date
+        return datetime(d.year, d.month, d.day)
     
-    return dobj(str_date[0], str_date[1], str_date[2])
+    return d
 
 def save_to_csv(data, head=None, fname=None):
-    ''' Write data to csv file '''
+    ''' 
+    Write data to csv file (gzip file if fname ends with .gz)
+    See export.write_csv for supported data types
+    '''
     
-    if fname:  # file path selected by user
-        f = open(fname, 'w')
-    else:  # temp file
+    if not fname:  # temp file
         f = NamedTemporaryFile(suffix='.csv', prefix='pyswrve_', delete=False)
         fname = f.name
-
-    # Data can be dict from api.SwrveSession.get_evt_stat 
-    # if method return dict with payload
-    if type(data) == dict:
-        
-        # If data[key] = [ [DATE, value], [DATE2, value2] ... ]
-        if type(data[data.keys()[0]][0]) == list:
-            fields = ['DATE'] + data.keys()
-            l = True
-        else:  # data[key] = [value1, value2, ... ]
-            fields = data.keys()
-            l = False
-        
-        w = csv.DictWriter(f, fieldnames=fields)
-        w.writeheader()
-        
-        for i in range(len(data[data.keys()[0]])):
-            row = {}
-            for key in data.keys():
-                if l:  # data[key][i] == ['D-2015-01-31', 125.00]
-                    row[key] = data[key][i][1]
-                else:  # data[key][i] = 125.00
-                    row[key] = data[key][i]
-            
-            if l:  # DATE 
-                row['DATE'] = data[data.keys()[0]][i][0]
-            
-            w.writerow(row)
-
-    # Data can be list with KPI, events fired, etc...            
-    elif type(data) == list:
-        w = csv.writer(f)
-        
-        if head:
-            w.writerow(head)
-        
-        # data[0] == ['D-2015-01-31', 125.00]
-        if type(data[0]) == list:
-            w.writerows(data)
-        else:  # data = [100.00, 125.00, 150.00 ... ]
-            w.writerows([[i] for i in data])    
-        
-    f.close()
+        f.close()
+    
+    write_csv(data, fname, head)
     print('File %s saved' % fname)
 
 def generate_pyplot_styles(count=None, with_black=False, with_white=False):
@@ -249,20 +598,7 @@ def generate_pyplot_styles(count=None, with_black=False, with_white=False):
 def generate_dates_list(start, stop):
     ''' Generate list with dates as strings like '2015-01-31' '''
     
-    dates_list = []
-    
-    # '2015-05-14' => (2015, 5, 14)
-    start = start.split('-')
-    stop = stop.split('-')
-    for i in range(3):
-        start[i] = int(start[i])
-        stop[i] = int(stop[i])
+    start = parse_date(start).toordinal()
+    stop = parse_date(stop).toordinal()
     
-    # dt since start to stop
-    dt = date(stop[0], stop[1], stop[2]) - date(start[0], start[1], start[2])
-    
-    for i in range(dt.days+1):
-        d = str(date(start[0], start[1], start[2]) + timedelta(days=i))
-        dates_list.append(d)
-        
-    return dates_list
+    return [str(date.fromordinal(i)) for i in range(start, stop + 1)]
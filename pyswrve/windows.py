@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import json
+from datetime import date, datetime, timedelta
+
+def to_date(d):
+    ''' Convert '2015-01-31' string (or date) to datetime.date '''
+
+    if isinstance(d, datetime):
+        return d.date()
+    elif isinstance(d, date):
+        return d
+    return datetime.strptime(str(d), '%Y-%m-%d').date()
+
+def split_range(start, stop, window):
+    '''
+    Split dates range to windows
+    # window - 'week', 'month', 'quarter', 'year' (calendar periods)
+    # or count of days
+    Return list with (start, stop) tuples of strings like '2015-01-31'
+    '''
+
+    start = to_date(start)
+    stop = to_date(stop)
+
+    res = []
+    while start <= stop:
+        if window == 'week':
+            end = start + timedelta(days=6 - start.weekday())
+        elif window in ('month', 'quarter', 'year'):
+            if window == 'month':
+                month = start.month + 1
+            elif window == 'quarter':
+                month = (start.month - 1) // 3 * 3 + 4
+            else:
+                month = 13
+            year = start.year + (month - 1) // 12
+            month = (month - 1) % 12 + 1
+            end = date(year, month, 1) - timedelta(days=1)
+        else:  # count of days
+            end = start + timedelta(days=int(window) - 1)
+
+        end = min(end, stop)
+        res.append((str(start), str(end)))
+        start = end + timedelta(days=1)
+
+    return res
+
+def series_id(d):
+    ''' Return id of series from response, all fields except data '''
+
+    return json.dumps(sorted((k, v) for k, v in d.items() if k != 'data'))
+
+def merge_responses(parts, windows):
+    '''
+    Merge time series responses of following windows to one response
+    Series are matched by all fields except data, if series is absent in
+    some window its values there are 0
+    '''
+
+    series = []  # series ids in order of first appearance
+    fields = {}
+    windows_data = []
+    for req, (start, stop) in zip(parts, windows):
+        by_id = {}
+        labels = None  # dates labels of window
+        for d in req:
+            sid = series_id(d)
+            if sid not in fields:
+                series.append(sid)
+                fields[sid] = d
+            by_id[sid] = d['data']
+            if labels is None and d['data']:
+                labels = [i[0] for i in d['data']]
+
+        if labels is None:
+            start = to_date(start)
+            labels = ['D-%s' % (start + timedelta(days=i))
+                      for i in range((to_date(stop) - start).days + 1)]
+        windows_data.append((labels, by_id))
+
+    res = []
+    for sid in series:
+        d = dict((k, v) for k, v in fields[sid].items() if k != 'data')
+        d['data'] = []
+        for labels, by_id in windows_data:
+            if sid in by_id:
+                d['data'].extend(by_id[sid])
+            else:
+                d['data'].extend([i, 0] for i in labels)
+        res.append(d)
+
+    return res
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from distutils.core import setup
+import sys
+from setuptools import setup
+
+requires = ['requests']
+if sys.version_info[0] < 3:  # Python 2 needs concurrent.futures backport
+    requires.append('futures')
 
 setup(
     name = 'pyswrve',
@@ -12,9 +17,18 @@ setup(
     
     description = 'Unofficial Python wrapper for Swrve Export API',
     
-    requires = ['requests'],
+    install_requires = requires,
+    extras_require = {
+        'yaml': ['PyYAML'],
+        'parquet': ['pyarrow'],
+        'numpy': ['numpy'],
+        'async': ['aiohttp'],
+    },
 
     packages = ['pyswrve'],
+    entry_points = {
+        'console_scripts': ['pyswrve = pyswrve.cli:main'],
+    },
     
     classifiers=[
         'Intended Audience :: Developers',
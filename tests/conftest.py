@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pyswrve.api import SwrveSession
+from pyswrve.metrics import MetricsCollector
+from pyswrve.stub import StubServer
+
+@pytest.fixture(scope='session')
+def stub():
+    ''' Stub server shared by all tests, data is deterministic '''
+
+    with StubServer(items=10, payload_values=5, files=2,
+                    file_size=65536) as server:
+        yield server
+
+@pytest.fixture
+def metrics():
+    return MetricsCollector()
+
+@pytest.fixture
+def session(stub, metrics):
+    ''' Session for 2015-01-01 .. 2015-01-10 with metrics hooks '''
+
+    s = SwrveSession('key', 'key', base_url=stub.url, hooks=metrics)
+    s.transport.backoff = 0.01
+    s.set_dates('2015-01-01', '2015-01-10')
+    yield s
+    s.close()
+
+def requests_count(metrics, name=None):
+    ''' Return count of requests (of endpoint name) seen by metrics '''
+
+    endpoints = metrics.snapshot()['endpoints']
+    if name is not None:
+        return endpoints.get(name, {}).get('requests', 0)
+    return sum(m['requests'] for m in endpoints.values())
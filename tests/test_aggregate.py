@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date, datetime
+
+import pytest
+
+from pyswrve import aggregate
+from pyswrve.utils import generate_dates_list, str2date
+
+def test_parse_date():
+
+    assert aggregate.parse_date('D-2015-01-31') == date(2015, 1, 31)
+    assert aggregate.parse_date('2015-1-5') == date(2015, 1, 5)
+    assert str2date('2015-1-5') == date(2015, 1, 5)
+    assert str2date('2015-1-5', True) == datetime(2015, 1, 5)
+    assert generate_dates_list('2015-1-30', '2015-2-2') == \
+        generate_dates_list('2015-01-30', '2015-02-02')
+
+def kpi_rows(days):
+    return [['D-2015-%02d-%02d' % (1 + i // 28, 1 + i % 28),
+             None if i % 3 else float(i), 1.0] for i in range(days)]
+
+@pytest.mark.parametrize('how', aggregate.REDUCERS)
+def test_resample_none(monkeypatch, how):
+
+    # None is 0 for pure python and numpy reducers
+    rows = kpi_rows(56)
+    small = aggregate.resample(rows, 'month', how)
+    monkeypatch.setattr(aggregate, 'NUMPY_MIN_SIZE', 1)
+    assert aggregate.resample(rows, 'month', how) == small
+    assert small[0][0] == '2015-01-01' and small[1][0] == '2015-02-01'
+
+def test_resample():
+
+    rows = kpi_rows(56)
+    assert aggregate.resample(rows, 'month', 'sum') == \
+        [['2015-01-01', float(sum(range(0, 28, 3))), 28.0],
+         ['2015-02-01', float(sum(range(30, 56, 3))), 28.0]]
+    assert aggregate.resample(rows, 7, 'count')[0] == ['2015-01-01', 7, 7]
+
+    data = {'a': [[r[0], r[1]] for r in rows]}
+    assert aggregate.resample(data, 'isoweek', 'max')['a'][0] == \
+        ['2014-12-29', 3.0]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import asyncio, inspect
+
+import pytest
+
+aio = pytest.importorskip('pyswrve.aio')
+pytest.importorskip('aiohttp')
+
+def run(session, coro_func):
+    ''' Run coroutine function with session and close session '''
+
+    async def main():
+        async with session:
+            return await coro_func(session)
+
+    return asyncio.run(main())
+
+@pytest.fixture
+def async_session(stub):
+    s = aio.AsyncSwrveSession('key', 'key', base_url=stub.url)
+    s.set_dates('2015-01-01', '2015-01-10')
+    return s
+
+def test_same_results(async_session, session):
+
+    async def func(s):
+        return (await s.get_kpi('dau'),
+                await s.get_few_kpi(['dau', 'mau'], per_user=True),
+                await s.get_evt_stat('event.1', 'key1'),
+                await s.get_item_matrix(['item1'], currencies=['gold']))
+
+    kpi, few, evt, items = run(async_session, func)
+    assert kpi == session.get_kpi('dau')
+    assert few == session.get_few_kpi(['dau', 'mau'], per_user=True)
+    assert evt == session.get_evt_stat('event.1', 'key1')
+    assert items == session.get_item_matrix(['item1'], currencies=['gold'])
+
+def test_segment_matrix(async_session, session):
+
+    async def func(s):
+        return await s.get_segment_matrix(['dau', 'mau'], ['event.1'],
+                                          segments=['Segment 1', 'Segment 2'],
+                                          per_user=True, workers=4)
+
+    assert run(async_session, func) == session.get_segment_matrix(
+        ['dau', 'mau'], ['event.1'], segments=['Segment 1', 'Segment 2'],
+        per_user=True, workers=4)
+
+def test_get_derived(async_session, session):
+
+    exprs = {'net_arpu': 'dollar_revenue * (1 - tax) / dau',
+             'payload': 'event("event.1", "key1", "2") / dau'}
+
+    async def func(s):
+        return await s.get_derived(exprs, variables={'tax': 0.3})
+
+    assert run(async_session, func) == \
+        session.get_derived(exprs, variables={'tax': 0.3})
+
+def test_evt_stat_stream(async_session, session):
+
+    async def func(s):
+        return (await s.get_evt_stat('event.1', 'key1', payload_sum=True,
+                                     stream=True),
+                await s.get_evt_stat('event.1', 'key1', payload_val='2',
+                                     stream=True))
+
+    assert run(async_session, func) == (
+        session.get_evt_stat('event.1', 'key1', payload_sum=True,
+                             stream=True),
+        session.get_evt_stat('event.1', 'key1', payload_val='2', stream=True))
+
+# Methods which only change session state and are sync on async session too
+SYNC_METHODS = ('save_defaults', 'set_param', 'set_dates',
+                'invalidate_dau_cache')
+
+def test_async_methods():
+
+    # Every public method of SwrveSession is a coroutine with the same
+    # arguments on async session, inherited sync methods would block loop
+    # or return coroutines to thread pool
+    for name, func in vars(aio.SwrveSession).items():
+        if name.startswith('_') or not inspect.isfunction(func):
+            continue
+        method = getattr(aio.AsyncSwrveSession, name)
+        if name in SYNC_METHODS:
+            assert method is func, name
+            continue
+        assert inspect.iscoroutinefunction(method), name
+        assert list(inspect.signature(method).parameters) == \
+            list(inspect.signature(func).parameters), name
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import threading, time
+
+import pytest
+
+from pyswrve.api import SwrveSession
+from pyswrve.errors import SwrveAPIError, SwrveHTTPError
+from pyswrve.stub import StubServer
+
+from tests.conftest import requests_count
+
+def test_get_kpi(session):
+
+    data = session.get_kpi('dau')
+    assert len(data) == 10
+    assert data[0][0] == 'D-2015-01-01'
+    assert session.get_kpi('dau', with_date=False) == [i[1] for i in data]
+
+def test_get_kpi_tax(session):
+
+    data = session.get_kpi('dollar_revenue')
+    taxed = session.get_kpi('dollar_revenue', tax=0.3)
+    assert taxed == [[d, round(v * 0.7, 2) if v else v] for d, v in data]
+
+def test_get_few_kpi(session, metrics):
+
+    factors = ['dau', 'mau', 'new_users']
+    data = session.get_few_kpi(factors, workers=4)
+    assert data[0][0] == 'D-2015-01-01'
+    for i, factor in enumerate(factors):
+        assert [row[i+1] for row in data] == \
+            session.get_kpi(factor, with_date=False)
+
+def test_get_few_kpi_per_user(session, metrics):
+
+    data = session.get_few_kpi(['mau', 'new_users'], per_user=True,
+                               workers=4)
+    assert requests_count(metrics, 'kpi/dau.json') == 1
+    dau = session.get_dau()
+    mau = session.get_kpi('mau', with_date=False)
+    assert [row[1] for row in data] == \
+        [round(m / d, 4) if d else 0 for m, d in zip(mau, dau)]
+
+def test_few_kpi_dau_in_pool(session, monkeypatch):
+
+    # DAU is requested by pool thread together with factors
+    threads = []
+    get_dau = session.get_dau
+
+    def get_func(params=None):
+        threads.append(threading.current_thread())
+        return get_dau(params)
+
+    monkeypatch.setattr(session, 'get_dau', get_func)
+    data = session.get_few_kpi(['dau', 'dollar_revenue'], per_user=True,
+                               tax=0.3, workers=4)
+    assert threads and threading.current_thread() not in threads
+    assert [row[2] for row in data] == session.get_kpi_dau(
+        'dollar_revenue', with_date=False, tax=0.3)
+
+def test_dau_cache(session, metrics):
+
+    assert session.get_dau() == session.get_dau()
+    assert requests_count(metrics, 'kpi/dau.json') == 1
+    session.invalidate_dau_cache()
+    session.get_dau()
+    assert requests_count(metrics, 'kpi/dau.json') == 2
+
+def test_dau_cache_keys(session, metrics, monkeypatch):
+
+    # DAU of other app isn't reused after api_key is changed
+    session.get_dau()
+    session.set_param('api_key', 'key2')
+    session.get_kpi_dau('mau')
+    assert requests_count(metrics, 'kpi/dau.json') == 2
+
+    # DAU of history period expires
+    params = dict(session.defaults, start=None, stop=None,
+                  history='current_month')
+    session.get_dau(params)
+    session.get_dau(params)
+    assert requests_count(metrics, 'kpi/dau.json') == 3
+    now = time.time()
+    monkeypatch.setattr(time, 'time',
+                        lambda: now + session.history_dau_ttl + 1)
+    session.get_dau(params)
+    assert requests_count(metrics, 'kpi/dau.json') == 4
+
+def test_get_evt_stat(session):
+
+    data = session.get_evt_stat('event.1')
+    assert list(data.keys()) == ['event.1']
+    assert len(data['event.1']) == 10
+
+    payload = session.get_evt_stat('event.1', 'key1')
+    assert sorted(payload.keys()) == ['0', '1', '2', '3', '4']
+    value = session.get_evt_stat('event.1', 'key1', '3')
+    assert value == {'3': payload['3']}
+
+def test_get_evt_stat_stream(session):
+
+    payload = session.get_evt_stat('event.1', 'key1', payload_sum=True)
+    assert session.get_evt_stat('event.1', 'key1', payload_sum=True,
+                                stream=True) == payload
+
+def test_get_evt_stat_bulk(session, metrics):
+
+    data = session.get_evt_stat_bulk(['event.1', ('event.2', 'key1', '3'),
+                                      ('event.2', 'key1', ['1', '2'])])
+    assert sorted(data.keys(), key=str) == sorted(
+        [('event.1', None, None), ('event.2', 'key1', '1'),
+         ('event.2', 'key1', '2'), ('event.2', 'key1', '3')], key=str)
+    assert requests_count(metrics) == 2  # one payload request for key1
+
+def test_get_item_matrix(session, metrics):
+
+    data = session.get_item_matrix(['item1', 'item2'], currencies=['gold'],
+                                   per_user=True)
+    assert sorted(data.keys()) == [('revenue', 'item1', 'gold'),
+                                   ('revenue', 'item2', 'gold'),
+                                   ('sales', 'item1', 'gold'),
+                                   ('sales', 'item2', 'gold')]
+    assert requests_count(metrics, 'kpi/dau.json') == 1
+
+def test_lists(session):
+
+    assert len(session.get_evt_lst()) == 10
+    assert session.get_evt_lst(q='event.1') == ['event.1']
+    assert len(session.get_segment_lst()) == 10
+    assert len(session.get_payload_lst('event.1')) == 10
+
+def test_active_only(stub):
+
+    s = SwrveSession('key', 'key', base_url=stub.url)
+    s.set_dates('2015-01-01', '2015-01-10')
+    events = s.get_evt_lst()
+    active = [e for e in events if stub.active(e)]
+    assert s.get_evt_lst(active_only=True, workers=4) == active
+    assert s.get_evt_lst(active_only=True) == active
+
+def test_windows(session, stub):
+
+    s = SwrveSession('key', 'key', base_url=stub.url, window=3)
+    s.set_dates('2015-01-01', '2015-01-10')
+    assert s.get_kpi('dau') == session.get_kpi('dau')
+    assert s.get_evt_stat('event.1', 'key1') == \
+        session.get_evt_stat('event.1', 'key1')
+
+def test_api_error(session):
+
+    with pytest.raises(SwrveAPIError):
+        session.get_kpi('dau', params={'api_key': 'key'})
+
+def test_http_errors():
+
+    with StubServer(error_rate=1, error_statuses=(503,)) as stub:
+        s = SwrveSession('key', 'key', base_url=stub.url)
+        s.transport.max_retries = 1
+        s.transport.backoff = 0.01
+        with pytest.raises(SwrveHTTPError) as e:
+            s.get_kpi('dau')
+        assert e.value.status == 503
+
+def test_retries(metrics):
+
+    with StubServer(error_rate=0.2) as stub:
+        s = SwrveSession('key', 'key', base_url=stub.url, hooks=metrics)
+        s.transport.backoff = 0.01
+        s.set_dates('2015-01-01', '2015-01-10')
+        for i in range(10):
+            assert len(s.get_kpi('dau')) == 10
+
+def test_get_segment_matrix(session):
+
+    data = session.get_segment_matrix(['dau', 'mau'], ['event.1'],
+                                      segments=['Segment 1', 'Segment 2'])
+    assert sorted(data.keys()) == ['Segment 1', 'Segment 2']
+    params = dict(session.defaults, segment='Segment 2')
+    assert [row[2] for row in data['Segment 2']] == \
+        session.get_kpi('mau', with_date=False, params=params)
+    assert data['Segment 2'][0][0] == 'D-2015-01-01'
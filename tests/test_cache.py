@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from pyswrve.api import SwrveSession
+from pyswrve.cache import ResponseCache, SingleFlightCache
+
+from tests.conftest import requests_count
+
+@pytest.fixture
+def cache(tmpdir):
+    c = ResponseCache(str(tmpdir.join('cache.sqlite')))
+    yield c
+    c.close()
+
+def series(params):
+    ''' Response like swrve returns for start .. stop params '''
+
+    from pyswrve.utils import generate_dates_list
+    return [{'name': 'dau',
+             'data': [['D-%s' % d, int(d[-2:])] for d in
+                      generate_dates_list(params['start'], params['stop'])]}]
+
+class Counter(object):
+    ''' Request function which saves requested params '''
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, params):
+        self.calls.append((params['start'], params['stop']))
+        return series(params)
+
+def test_fetch_saved_days(cache):
+
+    func = Counter()
+    params = {'api_key': 'key', 'start': '2015-01-01', 'stop': '2015-01-10'}
+    assert cache.fetch('url', params, func) == series(params)
+    assert cache.fetch('url', params, func) == series(params)
+    assert func.calls == [('2015-01-01', '2015-01-10')]
+    assert cache.stats()['hits'] == 10
+
+    # Only new days are requested
+    params['stop'] = '2015-01-12'
+    assert cache.fetch('url', params, func) == series(params)
+    assert func.calls[1:] == [('2015-01-11', '2015-01-12')]
+
+def test_fetch_other_params(cache):
+
+    func = Counter()
+    params = {'api_key': 'key', 'start': '2015-01-01', 'stop': '2015-01-02'}
+    cache.fetch('url', params, func)
+    cache.fetch('url', dict(params, segment='Payers'), func)
+    cache.fetch('url2', params, func)
+    assert len(func.calls) == 3
+
+def test_history_not_cached(cache):
+
+    func = Counter()
+    params = {'api_key': 'key', 'history': 'current_month',
+              'start': '2015-01-01', 'stop': '2015-01-02'}
+    cache.fetch('url', params, func)
+    cache.fetch('url', params, func)
+    assert len(func.calls) == 2
+
+def test_session_cache(stub, metrics, cache):
+
+    s = SwrveSession('key', 'key', base_url=stub.url, hooks=metrics,
+                     cache=cache)
+    s.set_dates('2015-01-01', '2015-01-10')
+    data = s.get_kpi('dau')
+    assert s.get_kpi('dau') == data
+    assert requests_count(metrics) == 1
+    assert metrics.snapshot()['caches']['response']['hits'] == 10
+
+def test_single_flight():
+
+    cache = SingleFlightCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    res = []
+    threads = [threading.Thread(target=lambda: res.append(cache.get('k', func)))
+               for i in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert res == ['value'] * 4
+    assert len(calls) == 1
+    assert cache.get('k', func) == 'value'
+
+def test_fetch_missing_runs(cache):
+
+    func = Counter()
+    params = {'api_key': 'key', 'start': '2015-01-05', 'stop': '2015-01-10'}
+    cache.fetch('url', params, func)
+
+    # Every contiguous run of missing days is requested separately
+    params.update(start='2015-01-01', stop='2015-01-12')
+    assert cache.fetch('url', params, func) == series(params)
+    assert func.calls[1:] == [('2015-01-01', '2015-01-04'),
+                              ('2015-01-11', '2015-01-12')]
+
+def test_partial_days_refetched(cache, monkeypatch):
+
+    import pyswrve.cache
+
+    today = date.today()
+    func = Counter()
+    params = {'api_key': 'key', 'start': str(today - timedelta(days=5)),
+              'stop': str(today - timedelta(days=1))}
+    cache.fetch('url', params, func)
+    cache.fetch('url', params, func)
+    assert len(func.calls) == 1  # mutable days are valid for ttl
+
+    class Later(date):
+        @classmethod
+        def today(cls):
+            return today + timedelta(days=3)
+
+    # Days fetched while they were mutable are requested once they are final
+    monkeypatch.setattr(pyswrve.cache, 'date', Later)
+    cache.fetch('url', params, func)
+    yesterday = str(today - timedelta(days=1))
+    assert func.calls[1:] == [(yesterday, yesterday)]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import csv, io, json
+from datetime import date
+
+from pyswrve import cli
+
+JOBS = {
+    'apps': {'app1': ['key', 'key'], 'app2': ['key2', 'key2']},
+    'segments': [None, 'Segment 1'],
+    'dates': {'start': '2015-01-01', 'stop': '2015-01-05'},
+    'variables': {'tax': 0.3},
+    'jobs': [
+        {'name': 'kpi', 'kpi': ['dau', 'dollar_revenue']},
+        {'name': 'events', 'events': ['event.1', ['event.2', 'key1', '3']],
+         'expressions': {'net_arpu': 'dollar_revenue * (1 - tax) / dau'}},
+    ],
+}
+
+def write_jobs(tmpdir, jobs):
+    path = str(tmpdir.join('jobs.json'))
+    with open(path, 'w') as f:
+        json.dump(jobs, f)
+    return path
+
+def test_plan(tmpdir):
+
+    jobs = cli.load_jobs(write_jobs(tmpdir, JOBS))
+    groups = cli.plan(jobs)
+    assert len(groups) == 4  # 2 apps x 2 segments, jobs are merged
+    assert groups[0]['requests'] == [('kpi', 'dau'),
+                                     ('kpi', 'dollar_revenue'),
+                                     ('event', 'event.1', None, None),
+                                     ('event', 'event.2', 'key1')]
+
+    out = io.StringIO()
+    cli.print_plan(jobs, groups, out)
+    assert 'Total: 16 requests for 2 jobs' in out.getvalue()
+
+def test_dry_run(tmpdir, capsys):
+
+    assert cli.main([write_jobs(tmpdir, JOBS), '--dry-run']) == 0
+    assert 'Total: 16 requests for 2 jobs' in capsys.readouterr().out
+
+def test_period_rows(tmpdir):
+
+    # Dates of period job are computed once by plan, rows don't depend on
+    # the day they are written
+    jobs = [{'name': 'kpi', 'apps': ['app1'], 'kpi': ['dau'],
+             'dates': {'period': 'day'}}]
+    groups = cli.plan(jobs, today=date(2015, 1, 3))
+    results = [{'dau': [['D-2015-01-01', 1.0], ['D-2015-01-02', 2.0]]}]
+    assert list(cli.job_rows(0, jobs[0], groups, results)) == \
+        [['D-2015-01-01', 'app1', '', 1.0], ['D-2015-01-02', 'app1', '', 2.0]]
+
+def test_workers_budget():
+
+    class Session(object):
+        defaults = {}
+        def get_derived(self, exprs, params, variables, workers):
+            used.append(workers)
+            return []
+
+    used = []
+    groups = [{'app': 'app', 'segment': None, 'start': '2015-01-01',
+               'stop': '2015-01-02', 'variables': {}, 'exprs': ['dau']}] * 3
+    cli.run_groups({'app': Session()}, groups, workers=8)
+    assert used == [2, 2, 2]  # 3 groups x 2 requests <= 8
+
+def test_run(tmpdir, stub, capsys):
+
+    jobs = dict(JOBS)
+    jobs['jobs'] = [dict(job, output=str(tmpdir.join('%s.csv' % job['name'])))
+                    for job in JOBS['jobs']]
+    path = write_jobs(tmpdir, jobs)
+    assert cli.main([path, '--base-url', stub.url, '--workers', '4']) == 0
+
+    with open(str(tmpdir.join('kpi.csv'))) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['DATE', 'APP', 'SEGMENT', 'dau', 'dollar_revenue']
+    assert len(rows) == 1 + 5 * 4
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import gzip, hashlib, io, os
+
+import pytest
+
+from pyswrve.utils import Downloader, partition_rows
+
+@pytest.fixture
+def downloader(stub, metrics):
+    d = Downloader('key', 'key', base_url=stub.url, hooks=metrics,
+                   backoff=0.01, max_attempts=2)
+    yield d
+    d.transport.close()
+
+def test_get_urls(downloader, stub):
+
+    urls = downloader.get_urls('users')
+    assert urls == ['%s/files/users_%s.csv.gz' % (stub.url, i)
+                    for i in range(2)]
+    assert downloader.get_urls('events') == \
+        ['%s/files/events.csv.gz' % stub.url]
+
+def test_download(downloader, stub, tmpdir):
+
+    urls = downloader.get_urls('users')
+    checksums = dict((url, hashlib.md5(stub.file(url.rsplit('/', 1)[1]))
+                      .hexdigest()) for url in urls)
+    downloader.load_to_queue(urls, checksums)
+    stats = downloader.download_start(str(tmpdir), workers=2)
+
+    assert stats['files'] == 2
+    for url in urls:
+        name = url.rsplit('/', 1)[1]
+        with open(str(tmpdir.join(name)), 'rb') as f:
+            assert f.read() == stub.file(name)
+        assert downloader.digests[url] == checksums[url]
+    assert not [i for i in os.listdir(str(tmpdir)) if i.endswith('.part')]
+
+def test_resume(downloader, stub, tmpdir):
+
+    url = downloader.get_urls('users')[0]
+    name = url.rsplit('/', 1)[1]
+    body = stub.file(name)
+    with open(str(tmpdir.join(name + '.part')), 'wb') as f:
+        f.write(body[:1000])
+
+    loaded = downloader.download_file(url, str(tmpdir))
+    assert loaded == len(body) - 1000
+    with open(str(tmpdir.join(name)), 'rb') as f:
+        assert f.read() == body
+
+def test_iter_rows(downloader, stub):
+
+    url = downloader.get_urls('users')[0]
+    text = gzip.GzipFile(fileobj=io.BytesIO(stub.file(
+        url.rsplit('/', 1)[1]))).read().decode('utf-8')
+
+    rows = list(downloader.iter_rows(url))
+    assert rows[0] == ['user_id', 'event', 'value', 'date']
+    assert len(rows) == len(text.splitlines())
+
+def test_ingest_file(downloader, tmpdir):
+
+    url = downloader.get_urls('users')[0]
+    counts = downloader.ingest_file(url, str(tmpdir), column='date')
+    rows = list(downloader.iter_rows(url))
+    assert sum(counts.values()) == len(rows) - 1
+    assert all(os.path.basename(p).startswith('date=2015-01-')
+               for p in counts)
+
+def test_size_mismatch(downloader, stub, tmpdir, monkeypatch, capsys):
+
+    url = downloader.get_urls('users')[0]
+    name = url.rsplit('/', 1)[1]
+    monkeypatch.setattr(Downloader, '_Downloader__expected_size',
+                        lambda self, req: 1)
+
+    downloader.download_file(url, str(tmpdir))
+    out = capsys.readouterr().out
+    assert 'size %s != 1' % len(stub.file(name)) in out
+    assert not os.listdir(str(tmpdir))
+
+def test_resume_changed_file(downloader, stub, tmpdir):
+
+    # Part of old file version isn't resumed, If-Range gets the whole file
+    url = downloader.get_urls('users')[0]
+    name = url.rsplit('/', 1)[1]
+    body = stub.file(name)
+    with open(str(tmpdir.join(name + '.part')), 'wb') as f:
+        f.write(b'x' * 1000)
+    with open(str(tmpdir.join(name + '.part.etag')), 'w') as f:
+        f.write('"old"')
+
+    assert downloader.download_file(url, str(tmpdir)) == len(body)
+    with open(str(tmpdir.join(name)), 'rb') as f:
+        assert f.read() == body
+    assert os.listdir(str(tmpdir)) == [name]
+
+def test_failed_download(downloader, stub, tmpdir, capsys):
+
+    urls = downloader.get_urls('users')
+    downloader.transport.max_retries = 0
+    downloader.load_to_queue([urls[0], 'http://127.0.0.1:1/files/x.csv.gz'])
+    stats = downloader.download_start(str(tmpdir))
+
+    assert stats['files'] == 1
+    assert stats['failed'] == ['http://127.0.0.1:1/files/x.csv.gz']
+    assert '1 files are failed' in capsys.readouterr().out
+
+def test_ingest_file_column(downloader, tmpdir):
+
+    url = downloader.get_urls('users')[0]
+    with pytest.raises(ValueError):
+        downloader.ingest_file(url, str(tmpdir), column='date', header=False)
+    with pytest.raises(ValueError):
+        downloader.ingest_file(url, str(tmpdir), column='missing')
+
+    counts = downloader.ingest_file(url, str(tmpdir), column=3, header=False)
+    assert sum(counts.values()) == len(list(downloader.iter_rows(url)))
+
+def test_iter_lines_close(downloader, monkeypatch):
+
+    # Response of generator closed before end of file is closed too
+    closed = []
+    get = downloader.transport.get
+
+    def get_func(*args, **kwargs):
+        req = get(*args, **kwargs)
+        close = req.close
+        req.close = lambda: closed.append(1) or close()
+        return req
+
+    monkeypatch.setattr(downloader.transport, 'get', get_func)
+    lines = downloader.iter_lines(downloader.get_urls('users')[0])
+    next(lines)
+    lines.close()
+    assert closed
+
+def test_permanent_errors(downloader, stub, tmpdir, monkeypatch, capsys):
+
+    # Client errors and local errors aren't retried, keys aren't printed
+    calls = []
+    get = downloader.transport.get
+    monkeypatch.setattr(downloader.transport, 'get',
+                        lambda *args, **kwargs: calls.append(1) or
+                        get(*args, **kwargs))
+
+    downloader.max_attempts = 5
+    downloader.download_file(stub.url + '/missing/x.csv.gz', str(tmpdir))
+    assert len(calls) == 1
+    url = downloader.get_urls('users')[0]
+    del calls[:]
+    downloader.download_file(url, str(tmpdir.join('missing')))
+
+    assert len(calls) == 1
+    out = capsys.readouterr().out
+    assert 'HTTP 404' in out and 'not retried' in out
+    assert 'personal_key' not in out
+    assert downloader.stats['failed'][-2:] == [
+        stub.url + '/missing/x.csv.gz', url]
+
+def test_partition_rows(tmpdir):
+
+    rows = [['a', '../../x'], ['b', 'x/y'], ['c', '..']] + \
+        [[str(i), str(i % 5)] for i in range(20)]
+    counts = partition_rows(iter(rows), str(tmpdir), 1, ['id', 'value'],
+                            'value', max_open=2)
+
+    assert sorted(os.listdir(str(tmpdir))) == sorted(
+        ['value=..%2F..%2Fx', 'value=x%2Fy', 'value=..'] +
+        ['value=%s' % i for i in range(5)])
+    for part, count in counts.items():
+        assert os.path.dirname(part) == str(tmpdir)
+        # Reopened files are appended, header is written once
+        with gzip.open(os.path.join(part, 'part.csv.gz'), 'rt') as f:
+            lines = f.read().splitlines()
+        assert lines[0] == 'id,value' and len(lines) == count + 1
+    assert counts[str(tmpdir.join('value=0'))] == 4
+
+def test_resume_without_checksum(downloader, stub, tmpdir, monkeypatch):
+
+    # Nothing is hashed and part isn't read again without checksum
+    def new(name):
+        raise AssertionError('digest is calculated')
+
+    url = downloader.get_urls('users')[0]
+    name = url.rsplit('/', 1)[1]
+    body = stub.file(name)
+    with open(str(tmpdir.join(name + '.part')), 'wb') as f:
+        f.write(body[:1000])
+
+    monkeypatch.setattr(hashlib, 'new', new)
+    assert downloader.download_file(url, str(tmpdir)) == len(body) - 1000
+    assert url not in downloader.digests
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import csv, gzip
+
+import pytest
+
+from pyswrve import export
+
+def read_csv(path):
+    f = gzip.open(path, 'rt') if path.endswith('.gz') else open(path)
+    with f:
+        return list(csv.reader(f))
+
+def test_write_csv_list(tmpdir):
+
+    path = str(tmpdir.join('kpi.csv'))
+    data = [['D-2015-01-01', 1.0, 2], ['D-2015-01-02', 3.5, None]]
+    assert export.write_csv(data, path, ['DATE', 'dau', 'mau'],
+                            batch_size=1) == 2
+    assert read_csv(path) == [['DATE', 'dau', 'mau'],
+                              ['D-2015-01-01', '1.0', '2'],
+                              ['D-2015-01-02', '3.5', '']]
+
+def test_write_csv_dict(tmpdir):
+
+    path = str(tmpdir.join('evt.csv.gz'))
+    data = {'1': [['D-2015-01-01', 1], ['D-2015-01-02', 2]],
+            '2': [['D-2015-01-01', 3], ['D-2015-01-02', 4]]}
+    assert export.write(data, path) == 2
+    rows = read_csv(path)
+    assert rows[0] == ['DATE'] + list(data.keys())
+    assert rows[1:] == [['D-2015-01-01'] + [str(v[0][1])
+                                           for v in data.values()],
+                        ['D-2015-01-02'] + [str(v[1][1])
+                                           for v in data.values()]]
+
+def test_write_csv_values(tmpdir):
+
+    # Plain values and generators, nothing is written for empty data
+    path = str(tmpdir.join('dau.csv'))
+    assert export.write_csv((i for i in [1, 2, 3]), path, ['dau']) == 3
+    assert read_csv(path) == [['dau'], ['1'], ['2'], ['3']]
+    assert export.write_csv([], path) == 0
+    assert read_csv(path) == []
+
+def test_long_rows():
+
+    matrix = {'all': [['D-2015-01-01', 1, 2]], 'Payers': [['D-2015-01-01',
+                                                           3, 4]]}
+    assert sorted(export.long_rows(matrix)) == \
+        [['Payers', 'D-2015-01-01', 3, 4], ['all', 'D-2015-01-01', 1, 2]]
+
+def test_parquet_rows(tmpdir):
+
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmpdir.join('kpi.parquet'))
+    data = [['D-2015-01-01', 1.0], ['D-2015-01-02', 2.0]]
+    assert export.write(data, path, ['DATE', 'dau']) == 2
+    assert pq.read_table(path).to_pydict() == \
+        {'DATE': ['D-2015-01-01', 'D-2015-01-02'], 'dau': [1.0, 2.0]}
+
+def test_parquet_time_series(tmpdir):
+
+    pq = pytest.importorskip('pyarrow.parquet')
+    ts = pytest.importorskip('pyswrve.series').TimeSeries.from_data(
+        [['D-2015-01-01', 1], ['D-2015-01-02', None]], 'dau')
+    path = str(tmpdir.join('ts.parquet'))
+    assert export.write(ts, path) == 2
+    table = pq.read_table(path)
+    assert table.column_names == ['DATE', 'dau']
+    assert table.column('dau').to_pylist() == [1.0, 0.0]
+
+def test_parquet_promotion(tmpdir):
+
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    # Zero days are ints, next batches have floats
+    rows = [['D-2015-01-01', 0, None]] * 15000 + \
+        [['D-2015-01-02', 1.5, 2.5]] * 10000
+    path = str(tmpdir.join('kpi.parquet'))
+    assert export.write_parquet(rows, path, ['DATE', 'dau', 'revenue'],
+                                batch_size=10000) == 25000
+
+    table = pq.read_table(path)
+    assert table.schema.field('dau').type == pa.float64()
+    assert table.schema.field('revenue').type == pa.float64()
+    assert table.column('dau').to_pylist()[-1] == 1.5
+    assert table.column('revenue').to_pylist()[0] is None
+
+def test_parquet_schema(tmpdir):
+
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    schema = pa.schema([('DATE', pa.string()), ('dau', pa.int64())])
+    path = str(tmpdir.join('dau.parquet'))
+    export.write([['D-2015-01-01', 1], ['D-2015-01-02', 2]], path,
+                 schema=schema)
+    assert pq.read_table(path).schema == schema
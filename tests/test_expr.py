@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pyswrve import expr
+from pyswrve.api import SwrveSession
+
+from tests.conftest import requests_count
+
+def test_parse_dependencies():
+
+    parsed = expr.parse({'a': 'dollar_revenue * (1 - tax) / dau',
+                         'b': 'event("e", "k", "1") + event("e", "k") / dau',
+                         'c': 'revenue("item") - sales("item", "gold")'},
+                        ['tax'], SwrveSession.kpi_factors)
+    keys = expr.dependencies(parsed)
+    assert set(keys) == set([('kpi', 'dollar_revenue'), ('kpi', 'dau'),
+                             ('event', 'e', 'k', '1'),
+                             ('event', 'e', 'k', None),
+                             ('revenue', 'item', None),
+                             ('sales', 'item', 'gold')])
+    assert len(expr.request_keys(keys)) == 5  # one request for e / k
+
+@pytest.mark.parametrize('text', ['__import__("os")', 'dau.real',
+                                  'dau if dau else 1', 'unknown_factor',
+                                  'event(dau)', '"text"', 'event()'])
+def test_not_allowed(text):
+
+    with pytest.raises(ValueError):
+        expr.Expression(text, factors=SwrveSession.kpi_factors)
+
+def test_evaluate_lists():
+
+    e = expr.Expression('(a + 1) / b * k', ['k'])
+    series = {('kpi', 'a'): [1.0, 2.0, 3.0], ('kpi', 'b'): [2.0, 0.0, 4.0]}
+    assert e.evaluate(series, {'k': 2}) == [2.0, 0, 2.0]
+
+def test_get_derived(session, metrics):
+
+    exprs = dict(('m%s' % i, 'dollar_revenue * (1 - tax) / dau * %s' % i)
+                 for i in range(50))
+    exprs['events'] = 'event("event.1") / dau'
+    data = session.get_derived(exprs, variables={'tax': 0.3}, ndigits=None)
+    assert requests_count(metrics) == 3
+
+    revenue = session.get_kpi('dollar_revenue', with_date=False)
+    dau = session.get_dau()
+    names = list(exprs.keys())
+    column = [row[names.index('m1') + 1] for row in data]
+    assert column == pytest.approx([r * 0.7 / d if d else 0
+                                    for r, d in zip(revenue, dau)])
+
+def test_get_derived_as_array(session):
+
+    ts = session.get_derived(['dau * 2', 'mau'], as_array=True)
+    assert ts.names == ['dau * 2', 'mau']
+    assert list(ts['dau * 2']) == [i * 2 for i in session.get_dau()]
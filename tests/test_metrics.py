@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import json, time
+
+from pyswrve.metrics import MetricsCollector, endpoint
+
+def collector():
+
+    m = MetricsCollector(buckets=(0.1, 1))
+    url = 'https://dashboard.swrve.com/api/1/exporter/kpi/dau.json'
+    name = endpoint(url)
+    m.request_end(name, time.time(), 200, 100)
+    m.request_end(name, time.time() - 0.5, 503, 10)
+    m.request_end(name, time.time(), error=IOError('reset'))
+    m.retry(name, 503)
+    m.transferred(name, 5)
+    m.cache('dau', hits=2, misses=1)
+    return m
+
+def test_snapshot():
+
+    snap = collector().snapshot()
+    d = snap['endpoints']['kpi/dau.json']
+    assert d['requests'] == 3
+    assert d['statuses'] == {200: 1, 503: 1}
+    assert d['errors'] == 2
+    assert d['error_types'] == {type(IOError()).__name__: 1}
+    assert d['retries'] == 1 and d['bytes'] == 115
+    assert d['latency_buckets'] == [2, 1, 0]
+    assert snap['caches'] == {'dau': {'hits': 2, 'misses': 1}}
+
+def test_to_json():
+
+    data = json.loads(collector().to_json())
+    assert data['buckets'] == [0.1, 1]
+    assert data['endpoints']['kpi/dau.json']['statuses'] == \
+        {'200': 1, '503': 1}
+
+def test_to_prometheus():
+
+    lines = collector().to_prometheus().splitlines()
+    for line in (
+            '# TYPE pyswrve_requests_total counter',
+            'pyswrve_requests_total{endpoint="kpi/dau.json",status="200"} 1',
+            'pyswrve_requests_total{endpoint="kpi/dau.json",status="none"} 1',
+            'pyswrve_errors_total{endpoint="kpi/dau.json"} 2',
+            'pyswrve_bytes_total{endpoint="kpi/dau.json"} 115',
+            'pyswrve_request_seconds_bucket{endpoint="kpi/dau.json",\
+le="0.1"} 2',
+            'pyswrve_request_seconds_bucket{endpoint="kpi/dau.json",\
+le="+Inf"} 3',
+            'pyswrve_request_seconds_count{endpoint="kpi/dau.json"} 3',
+            'pyswrve_cache_hits_total{cache="dau"} 2'):
+        assert line in lines
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+from pyswrve.query import QueryFilter
+
+ITEMS = ['Purchase.Gold', 'purchase.gems', 'level.up', 'tutorial.start',
+         'purchase.gems', 'Tutorial.End']
+
+def test_substrings():
+
+    # Plain strings are case insensitive substrings, duplicates are removed
+    assert QueryFilter(['purchase']).filter(ITEMS) == \
+        ['Purchase.Gold', 'purchase.gems']
+    assert QueryFilter(['gold', 'level']).filter(ITEMS) == \
+        ['Purchase.Gold', 'level.up']
+    assert QueryFilter().filter(ITEMS) == \
+        ['Purchase.Gold', 'purchase.gems', 'level.up', 'tutorial.start',
+         'Tutorial.End']
+
+def test_nq():
+
+    assert QueryFilter(nq=['purchase', 'tutorial']).filter(ITEMS) == \
+        ['level.up']
+    assert QueryFilter(['purchase'], ['gems']).filter(ITEMS) == \
+        ['Purchase.Gold']
+
+def test_regex():
+
+    assert QueryFilter([r'^tutorial\.']).filter(ITEMS) == \
+        ['tutorial.start', 'Tutorial.End']
+    assert QueryFilter(nq=[r'\.(gems|up)$']).filter(ITEMS) == \
+        ['Purchase.Gold', 'tutorial.start', 'Tutorial.End']
+
+def test_get():
+
+    assert QueryFilter.get(['a'], ['b']) is QueryFilter.get(('a',), ('b',))
+    assert QueryFilter.get(['a']) is not QueryFilter.get(['b'])
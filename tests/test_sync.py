@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+import pytest
+
+from pyswrve.sync import SyncStore, Syncer
+
+@pytest.fixture
+def store(tmpdir):
+    s = SyncStore(str(tmpdir.join('sync.sqlite')))
+    yield s
+    s.close()
+
+def test_incremental_sync(session, store):
+
+    syncer = Syncer(store, refetch_days=2)
+    series = ['dau', 'event("event.1")']
+    res = syncer.sync(session, series, app='app', stop='2015-01-10',
+                      initial_start='2015-01-01')
+    assert res == {'dau': 10, 'event("event.1")': 10}
+
+    # Only new days and refetch_days already synced days are requested
+    assert syncer.plan(session, series, 'app', stop='2015-01-12') == \
+        {date(2015, 1, 9): series}
+    res = syncer.sync(session, series, app='app', stop='2015-01-12')
+    assert res == {'dau': 4, 'event("event.1")': 4}
+    assert store.mark('app', None, 'dau').isoformat() == '2015-01-12'
+
+    rows = store.rows('app', ['dau'])
+    assert len(rows) == 12
+    assert [row[1] for row in rows[:10]] == session.get_dau()
+
+    store.reset('app')
+    assert store.marks() == []
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from pyswrve.windows import merge_responses, split_range
+
+def test_split_days():
+
+    assert split_range('2015-01-01', '2015-01-07', 3) == [
+        ('2015-01-01', '2015-01-03'), ('2015-01-04', '2015-01-06'),
+        ('2015-01-07', '2015-01-07')]
+
+def test_split_calendar():
+
+    # 2015-01-01 is Thursday
+    assert split_range('2015-01-01', '2015-01-12', 'week') == [
+        ('2015-01-01', '2015-01-04'), ('2015-01-05', '2015-01-11'),
+        ('2015-01-12', '2015-01-12')]
+    assert split_range('2015-01-15', '2015-03-02', 'month') == [
+        ('2015-01-15', '2015-01-31'), ('2015-02-01', '2015-02-28'),
+        ('2015-03-01', '2015-03-02')]
+    assert split_range('2015-02-01', '2015-07-01', 'quarter') == [
+        ('2015-02-01', '2015-03-31'), ('2015-04-01', '2015-06-30'),
+        ('2015-07-01', '2015-07-01')]
+    assert split_range('2015-12-31', '2016-01-01', 'year') == [
+        ('2015-12-31', '2015-12-31'), ('2016-01-01', '2016-01-01')]
+
+def test_merge_responses():
+
+    windows = [('2015-01-01', '2015-01-02'), ('2015-01-03', '2015-01-03')]
+    parts = [
+        [{'name': 'a', 'data': [['D-2015-01-01', 1], ['D-2015-01-02', 2]]},
+         {'name': 'b', 'data': [['D-2015-01-01', 3], ['D-2015-01-02', 4]]}],
+        [{'name': 'a', 'data': [['D-2015-01-03', 5]]}],
+    ]
+    assert merge_responses(parts, windows) == [
+        {'name': 'a', 'data': [['D-2015-01-01', 1], ['D-2015-01-02', 2],
+                               ['D-2015-01-03', 5]]},
+        {'name': 'b', 'data': [['D-2015-01-01', 3], ['D-2015-01-02', 4],
+                               ['D-2015-01-03', 0]]}]